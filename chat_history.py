@@ -0,0 +1,183 @@
+# 按 token 预算管理多轮对话历史：对话越长，每轮重发的历史越多，请求体积、费用和延迟都随之增长
+#   - system 提示词和最近几轮对话原样保留
+#   - 过长的工具输出在加入历史时就截断
+#   - 超出预算时，把最早的几轮对话折叠进一段摘要；摘要会缓存，之后只把新折叠的对话并入摘要，不重新总结全部历史
+#   - 摘要本身最多占预算的 summary_ratio，折叠时预留出这部分，折叠后留有余量，不会每来一轮就要再总结一次
+#   - 每条消息的 token 数在加入时计算一次并缓存，总数增量维护，不必每轮重新统计整个列表
+# 其他目录下的脚本导入方式与 llm_client.py 相同:
+#   from chat_history import ConversationHistory
+import json
+import math
+
+# 每条消息除内容外的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+# 工具/函数结果消息的角色（qwen_agent 使用 function）
+TOOL_ROLES = ("tool", "function")
+
+
+def estimate_tokens(text):
+    """
+    粗略估计 token 数：中日韩字符大约一个字一个 token，其余字符大约 4 个字符一个 token。
+    没有安装分词器也能用，偏差对预算控制来说足够小
+    """
+    cjk = sum(1 for ch in text if '\u3000' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af' or '\uff00' <= ch <= '\uffef')
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _message_text(message):
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    # 工具调用请求本身也会占用 token
+    for key in ("tool_calls", "function_call"):
+        if message.get(key):
+            content += json.dumps(message[key], ensure_ascii=False, default=str)
+    return content
+
+
+def summarize_extractive(summary, messages, max_chars=200, max_summary_chars=2000):
+    """
+    默认的摘要方法（不调用大模型）：每条消息只保留开头一段，摘要总长超过 max_summary_chars 时丢弃最早的部分
+    """
+    lines = [summary] if summary else []
+    for message in messages:
+        text = _message_text(message).strip()
+        if text:
+            lines.append(f"{message['role']}: {text[:max_chars]}")
+    return "\n".join(lines)[-max_summary_chars:]
+
+
+def make_llm_summarizer(client, model="qwen-turbo", max_tokens=300):
+    """
+    用大模型生成摘要：把已有摘要和新折叠的对话一起交给模型，得到新的摘要
+    """
+    def summarize(summary, messages):
+        transcript = "\n".join(f"{m['role']}: {_message_text(m)}" for m in messages)
+        prompt = (
+            "请把下面的对话要点合并进已有摘要，保留用户的需求、已确认的信息和未完成的事项，不超过200字。\n"
+            f"已有摘要：{summary or '无'}\n新的对话：\n{transcript}"
+        )
+        completion = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+        )
+        return completion.choices[0].message.content.strip()
+    return summarize
+
+
+class ConversationHistory:
+    def __init__(self, system_messages=(), budget=6000, keep_recent_turns=4, max_tool_chars=2000,
+                 summarizer=summarize_extractive, count_tokens=estimate_tokens, summary_ratio=0.25):
+        """
+        :param system_messages: 始终原样保留的 system 消息
+        :param budget: messages() 返回的全部消息的 token 上限（估计值）
+        :param keep_recent_turns: 至少原样保留的最近对话轮数（一轮从一条 user 消息开始）
+        :param max_tool_chars: 工具输出超过该字符数时截断
+        :param summarizer: summarizer(已有摘要, 要折叠的消息列表) -> 新摘要
+        :param count_tokens: count_tokens(text) -> token 数，可换成真实的分词器
+        :param summary_ratio: 摘要最多占用的预算比例，超出时丢弃摘要中最早的内容
+        """
+        self.budget = budget
+        self.keep_recent_turns = keep_recent_turns
+        self.max_tool_chars = max_tool_chars
+        self.summarizer = summarizer
+        self.count_tokens = count_tokens
+        self.max_summary_tokens = int(budget * summary_ratio)
+        self.system_messages = list(system_messages)
+        self.system_tokens = sum(self._tokens(m) for m in self.system_messages)
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turns = []        # 每轮为 (消息列表, 该轮 token 数)
+        self.history_tokens = 0
+        self.folded_turns = 0
+
+    def _tokens(self, message):
+        return self.count_tokens(_message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+
+    def _truncate(self, message):
+        content = message.get("content")
+        if message.get("role") in TOOL_ROLES and isinstance(content, str) and len(content) > self.max_tool_chars:
+            message = dict(message)
+            message["content"] = content[:self.max_tool_chars] + f"\n…（工具输出过长，已截断 {len(content) - self.max_tool_chars} 字）"
+        return message
+
+    def append(self, message):
+        if not isinstance(message, dict):
+            # openai SDK 返回的消息对象
+            message = message.model_dump(exclude_none=True)
+        message = self._truncate(message)
+        tokens = self._tokens(message)
+        if message.get("role") == "user" or not self.turns:
+            self.turns.append(([], 0))
+        messages, turn_tokens = self.turns[-1]
+        messages.append(message)
+        self.turns[-1] = (messages, turn_tokens + tokens)
+        self.history_tokens += tokens
+        self._compact()
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    @property
+    def total_tokens(self):
+        return self.system_tokens + self.summary_tokens + self.history_tokens
+
+    def _compact(self):
+        if self.total_tokens <= self.budget or len(self.turns) <= 1:
+            return
+        # 折叠后的摘要最多占 max_summary_tokens，剩下的预算留给原样保留的对话
+        target = self.budget - self.system_tokens - self.max_summary_tokens
+        # 一次把最近 keep_recent_turns 轮之前的对话全部折叠（只调用一次摘要），避免之后每轮都要重新总结；
+        # 只保留这几轮仍超预算时继续折叠，最后一轮（当前这一轮）始终保留
+        fold_count = max(len(self.turns) - self.keep_recent_turns, 0)
+        remaining = self.history_tokens - sum(tokens for _, tokens in self.turns[:fold_count])
+        while remaining > target and fold_count < len(self.turns) - 1:
+            remaining -= self.turns[fold_count][1]
+            fold_count += 1
+        # 当前这一轮本身就放不下时，折叠也回不到预算以内，不调用摘要，等之后的对话再一起折叠
+        if fold_count == 0 or remaining > target:
+            return
+        folded = []
+        for messages, turn_tokens in self.turns[:fold_count]:
+            folded.extend(messages)
+            self.history_tokens -= turn_tokens
+        del self.turns[:fold_count]
+        self.folded_turns += fold_count
+        self.summary = self.summarizer(self.summary, folded)
+        self.summary_tokens = self._tokens(self._summary_message())
+        while self.summary and self.summary_tokens > self.max_summary_tokens:
+            # 摘要超出上限：按比例丢弃最早的内容，直到放得下
+            keep = int(len(self.summary) * self.max_summary_tokens / self.summary_tokens * 0.9)
+            self.summary = self.summary[len(self.summary) - keep:] if keep > 0 else ""
+            self.summary_tokens = self._tokens(self._summary_message()) if self.summary else 0
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"以下是之前对话的摘要：\n{self.summary}"}
+
+    def messages(self):
+        """
+        :return: 发送给模型的消息列表：system 消息 + 摘要（如有） + 最近的对话
+        """
+        result = list(self.system_messages)
+        if self.summary:
+            summary_message = self._summary_message()
+            if result and isinstance(result[-1].get("content"), str):
+                # 部分接口只接受开头的一条 system 消息，摘要并入其中
+                summary_message = dict(result[-1], content=result[-1]["content"] + "\n\n" + summary_message["content"])
+                result[-1] = summary_message
+            else:
+                result.append(summary_message)
+        for messages, _ in self.turns:
+            result.extend(messages)
+        return result
+
+    def stats(self):
+        return {
+            "total_tokens": self.total_tokens,
+            "budget": self.budget,
+            "recent_turns": len(self.turns),
+            "folded_turns": self.folded_turns,
+            "summary_tokens": self.summary_tokens,
+        }
@@ -0,0 +1,79 @@
+# 多进程数据并行扩展性测试：用 torchrun 分别以 1/2/4/8 个进程训练同一份合成 MNIST 数据，
+# 比较全局吞吐（样本/秒）和并行效率（相对单进程的理想线性加速）
+# 每个进程的 batch_size 固定，进程数越多全局批大小越大（弱扩展）
+# 用法示例:
+#   python benchmark_ddp.py
+#   python benchmark_ddp.py --processes 1 2 4 --samples 200000 --batch-size 128
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import torch
+import torch.nn as nn
+
+from benchmark_trainer import SyntheticDataset
+from ddp import cleanup_distributed, get_world_size, init_distributed, is_main_process
+from input_pipeline import make_loader, make_pipeline_config
+from mnist import NeuralNetwork, count_correct
+from trainer import Trainer, make_trainer_config
+
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+
+def worker(args):
+    init_distributed()
+    dataset = SyntheticDataset(args.samples)
+    loader = make_loader(dataset, args.batch_size, shuffle=True, config=make_pipeline_config(),
+                         batch_indexing=True, distributed=get_world_size() > 1)
+    model = NeuralNetwork()
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    trainer = Trainer(model, nn.CrossEntropyLoss(), optimizer, correct_fn=count_correct,
+                      config=make_trainer_config(device="cpu"))
+    trainer.train_epoch(loader)  # 预热
+    start = time.perf_counter()
+    for _ in range(args.epochs):
+        trainer.train_epoch(loader)
+    elapsed = time.perf_counter() - start
+    if is_main_process():
+        print(RESULT_PREFIX + json.dumps({"samples_per_second": args.epochs * args.samples / elapsed}), flush=True)
+    cleanup_distributed()
+
+
+def run(processes, args):
+    command = [sys.executable, "-m", "torch.distributed.run", "--standalone", f"--nproc-per-node={processes}",
+               __file__, "--worker", "--samples", str(args.samples), "--batch-size", str(args.batch_size),
+               "--epochs", str(args.epochs)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    for line in output.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])["samples_per_second"]
+    raise RuntimeError(f"没有拿到测试结果:\n{output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gloo 多进程数据并行扩展性测试")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--samples", type=int, default=60000)
+    parser.add_argument("--batch-size", type=int, default=64, help="每个进程的批大小")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args)
+        return
+
+    print(f"📊 样本数 {args.samples}，每进程 batch_size {args.batch_size}，CPU 核心数 {os.cpu_count()}")
+    print(f"{'进程数':>6}{'样本/秒':>14}{'加速比':>10}{'并行效率':>10}")
+    baseline = None
+    for processes in args.processes:
+        throughput = run(processes, args)
+        baseline = baseline or throughput
+        speedup = throughput / baseline
+        print(f"{processes:>6}{throughput:>14.0f}{speedup:>10.2f}{speedup / processes * 100:>9.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os
+
+import torch
+import torch.distributed as dist
+
+
+def init_distributed():
+    """
+    在 torchrun 启动的进程中初始化进程组（gloo 后端，多核 CPU 机器上多进程数据并行）。
+    不是由 torchrun 启动（没有 WORLD_SIZE 环境变量或只有一个进程）时什么也不做。
+    :return: (rank, world_size)
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size <= 1 or dist.is_initialized():
+        return get_rank(), get_world_size()
+    dist.init_process_group(backend="gloo")
+    # 每个进程平分 CPU 核心，避免 N 个进程各开满线程互相争抢
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    return dist.get_rank(), dist.get_world_size()
+
+
+def get_rank():
+    return dist.get_rank() if dist.is_initialized() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if dist.is_initialized() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def barrier():
+    if dist.is_initialized():
+        dist.barrier()
+
+
+def cleanup_distributed():
+    if dist.is_initialized():
+        dist.destroy_process_group()
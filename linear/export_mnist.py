@@ -0,0 +1,121 @@
+# MNIST 推理模型导出与性能测试：
+#   1. int8 动态量化：nn.Linear 的权重量化为 int8，激活在运行时动态量化，结果用 TorchScript 追踪保存
+#   2. fp32 计算图：用 torch.export 导出（批大小为动态维度），部署时不需要 Python 模型定义
+# 并在多个批大小下对比 eager fp32 / torch.compile / 导出图 / int8 的延迟和吞吐，同时在测试集上检查准确率
+# 用法示例:
+#   python export_mnist.py                      # 导出并测试
+#   python export_mnist.py --batch-sizes 1 64   # 只测部分批大小
+import argparse
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.ao.quantization import quantize_dynamic
+
+from mnist import CHECKPOINT_PATH, MNISTDataset, NeuralNetwork
+
+INT8_MODEL_PATH = r"data\mnist_int8.torchscript.pt"
+EXPORTED_MODEL_PATH = r"data\mnist_fp32.pt2"
+TEST_DATA_PATH = r"data\mnist_test.csv"
+
+
+def load_model(checkpoint_path):
+    state = torch.load(checkpoint_path, map_location="cpu", weights_only=True)
+    model = NeuralNetwork()
+    model.load_state_dict(state["model"])
+    return model.eval()
+
+
+def quantize(model):
+    # 只量化 nn.Linear：全连接网络几乎全部计算都在这里，ReLU 不需要量化
+    return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def export_models(model, int8_path=INT8_MODEL_PATH, exported_path=EXPORTED_MODEL_PATH):
+    # 示例输入的批大小不能取 1，否则 torch.export 会把批大小特化成常量
+    example = torch.zeros(2, 28 * 28)
+    with torch.inference_mode():
+        traced = torch.jit.trace(quantize(model), example)
+    torch.jit.save(traced, int8_path)
+    print(f"✅ int8 模型已保存到 {int8_path}")
+
+    batch = torch.export.Dim("batch")
+    exported = torch.export.export(model, (example,), dynamic_shapes={"x": {0: batch}})
+    torch.export.save(exported, exported_path)
+    print(f"✅ fp32 计算图已保存到 {exported_path}")
+
+
+def load_variants(model, int8_path=INT8_MODEL_PATH, exported_path=EXPORTED_MODEL_PATH):
+    return {
+        "eager fp32": model,
+        "compiled fp32": torch.compile(model),
+        "exported fp32": torch.export.load(exported_path).module(),
+        "int8": torch.jit.load(int8_path),
+    }
+
+
+@torch.inference_mode()
+def accuracy(model, dataset, batch_size=256):
+    correct = 0
+    for start in range(0, len(dataset), batch_size):
+        images, labels = dataset[list(range(start, min(start + batch_size, len(dataset))))]
+        correct += (torch.argmax(model(images), dim=1) == labels).sum().item()
+    return correct / len(dataset)
+
+
+@torch.inference_mode()
+def measure(model, batch_size, iterations):
+    inputs = torch.randn(batch_size, 28 * 28)
+    for _ in range(10):  # 预热（torch.compile 首次调用时编译）
+        model(inputs)
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        model(inputs)
+        latencies[i] = time.perf_counter() - start
+    return {
+        "p50_ms": np.percentile(latencies, 50) * 1000,
+        "samples_per_second": batch_size * iterations / latencies.sum(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MNIST 模型 int8 量化/导出与推理性能测试")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.5,
+                        help="相对 eager fp32 允许的最大准确率下降（百分点），超出时以非零状态退出")
+    args = parser.parse_args()
+
+    model = load_model(args.checkpoint)
+    export_models(model)
+    variants = load_variants(model)
+
+    # 准确率检查：量化或导出引入的误差不能让测试集准确率明显下降
+    test_dataset = MNISTDataset(TEST_DATA_PATH)
+    accuracies = {name: accuracy(variant, test_dataset) for name, variant in variants.items()}
+    baseline = accuracies["eager fp32"]
+    regressions = []
+    print(f"\n{'模型':<16}{'准确率':>10}{'变化(百分点)':>16}")
+    for name, value in accuracies.items():
+        drop = (baseline - value) * 100
+        print(f"{name:<16}{value * 100:>9.2f}%{-drop:>16.2f}")
+        if drop > args.max_accuracy_drop:
+            regressions.append(name)
+
+    print(f"\n{'模型':<16}{'batch':>8}{'p50(ms)':>10}{'样本/秒':>14}")
+    for batch_size in args.batch_sizes:
+        for name, variant in variants.items():
+            stats = measure(variant, batch_size, args.iterations)
+            print(f"{name:<16}{batch_size:>8}{stats['p50_ms']:>10.3f}{stats['samples_per_second']:>14.0f}")
+
+    if regressions:
+        print(f"\n❌ 准确率下降超过 {args.max_accuracy_drop} 个百分点: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
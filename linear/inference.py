@@ -0,0 +1,100 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+
+class MicroBatcher:
+    """
+    动态微批处理：多个调用方各自提交单条输入，后台线程把排队中的请求合并成一个批次一起推理。
+    凑满 max_batch_size 条或者第一条请求已等待 max_wait_ms 毫秒就立即执行，
+    并发量大时一次前向处理很多条，并发量小时单条请求最多多等 max_wait_ms。
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0):
+        """
+        :param predict_fn: predict_fn(inputs) -> 与输入等长的结果序列，inputs 为 torch.stack 后的批次张量
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        :return: Future，结果就绪后 future.result() 返回这一条输入的预测结果
+        """
+        if self._closed:
+            raise RuntimeError("MicroBatcher 已关闭")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        # 阻塞等待第一条请求，然后在截止时间前尽量多取
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # 关闭信号放回去，处理完这一批后退出
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            items, futures = zip(*batch)
+            try:
+                results = self.predict_fn(torch.stack(items))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        # 与 close 并发的 submit 可能在关闭信号之后才入队，后台线程已退出，这些请求直接以失败结束
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                request[1].set_exception(RuntimeError("MicroBatcher 已关闭"))
@@ -0,0 +1,176 @@
+import time
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import DataLoader, BatchSampler, DistributedSampler, RandomSampler, Sampler, SequentialSampler
+
+# 数据管道默认配置
+DEFAULT_PIPELINE_CONFIG = {
+    "num_workers": 0,            # 加载数据的子进程数，0 表示在主进程中加载
+    "persistent_workers": True,  # 每个 epoch 结束后保留子进程，下个 epoch 不必重新启动
+    "pin_memory": True,          # 使用锁页内存，加快并允许异步拷贝到 GPU（仅在有 CUDA 时生效）
+    "prefetch_factor": 2,        # 每个子进程预先准备好的批次数
+    "non_blocking": True,        # 拷贝到设备时不阻塞，和计算重叠
+}
+
+
+def make_pipeline_config(**overrides):
+    unknown = set(overrides) - set(DEFAULT_PIPELINE_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的数据管道参数: {sorted(unknown)}")
+    config = dict(DEFAULT_PIPELINE_CONFIG)
+    config.update(overrides)
+    return config
+
+
+def add_pipeline_args(parser):
+    parser.add_argument("--num-workers", type=int, default=DEFAULT_PIPELINE_CONFIG["num_workers"])
+    parser.add_argument("--prefetch-factor", type=int, default=DEFAULT_PIPELINE_CONFIG["prefetch_factor"])
+    parser.add_argument("--no-pin-memory", action="store_true")
+    parser.add_argument("--no-persistent-workers", action="store_true")
+    parser.add_argument("--benchmark", action="store_true", help="只测试各种数据管道配置的吞吐（样本/秒），不训练")
+
+
+def pipeline_config_from_args(args):
+    return make_pipeline_config(
+        num_workers=args.num_workers,
+        prefetch_factor=args.prefetch_factor,
+        pin_memory=not args.no_pin_memory,
+        persistent_workers=not args.no_persistent_workers,
+    )
+
+
+class ShardSampler(Sampler):
+    """
+    不补齐的分片采样器，用于多进程评估：第 rank 个进程依次取下标 rank, rank + world_size, ...
+    各进程的分片恰好覆盖整个数据集且互不重复（分片大小可能相差 1），汇总后的指标与单进程评估完全一致。
+    DistributedSampler 为了让各进程步数相同会补齐重复样本，只适合训练
+    """
+
+    def __init__(self, dataset):
+        self.num_samples = len(dataset)
+        self.rank = dist.get_rank()
+        self.world_size = dist.get_world_size()
+
+    def __iter__(self):
+        return iter(range(self.rank, self.num_samples, self.world_size))
+
+    def __len__(self):
+        return len(range(self.rank, self.num_samples, self.world_size))
+
+
+def make_loader(dataset, batch_size, shuffle=False, config=None, batch_indexing=False, distributed=False,
+                evaluation=False):
+    """
+    按配置创建 DataLoader
+    :param batch_indexing: 数据集支持用一批下标直接索引时设为 True，
+                           采样器每次给出一整批下标，数据集一次切出整个批次，不再逐条取样本再拼接
+    :param distributed: 多进程数据并行时设为 True，每个进程只取自己那一份数据（需已初始化进程组），
+                        batch_size 是每个进程的批大小
+    :param evaluation: 用于验证/测试时设为 True，多进程下用不补齐的 ShardSampler，每个样本恰好评估一次
+    """
+    config = config or DEFAULT_PIPELINE_CONFIG
+    kwargs = {
+        "num_workers": config["num_workers"],
+        # 锁页内存只对拷贝到 GPU 有意义，纯 CPU 训练时开启只会多一次拷贝
+        "pin_memory": config["pin_memory"] and torch.cuda.is_available(),
+    }
+    if config["num_workers"] > 0:
+        kwargs["persistent_workers"] = config["persistent_workers"]
+        kwargs["prefetch_factor"] = config["prefetch_factor"]
+
+    if distributed and evaluation:
+        sampler = ShardSampler(dataset)
+    elif distributed:
+        sampler = DistributedSampler(dataset, shuffle=shuffle)
+    else:
+        sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    if batch_indexing:
+        # batch_size=None 关闭 DataLoader 自己的自动分批，直接把采样器给出的下标列表交给数据集
+        return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last=False),
+                          batch_size=None, **kwargs)
+    return DataLoader(dataset, batch_size=batch_size, sampler=sampler, **kwargs)
+
+
+def set_epoch(loader, epoch):
+    """
+    DistributedSampler 的打乱顺序由 epoch 决定，每个 epoch 开始前都要设置，否则每轮顺序相同
+    """
+    sampler = loader.sampler
+    if isinstance(sampler, BatchSampler):
+        sampler = sampler.sampler
+    if isinstance(sampler, DistributedSampler):
+        sampler.set_epoch(epoch)
+
+
+class DevicePrefetcher:
+    """
+    把批次搬到训练设备上。在 GPU 上用一个单独的 CUDA 流提前拷贝下一个批次，
+    让主机到设备的拷贝和当前批次的计算重叠；在 CPU 上直接透传。
+    """
+
+    def __init__(self, loader, device, non_blocking=True):
+        self.loader = loader
+        self.device = torch.device(device)
+        self.non_blocking = non_blocking
+
+    def __len__(self):
+        return len(self.loader)
+
+    def _to_device(self, batch):
+        return tuple(t.to(self.device, non_blocking=self.non_blocking) for t in batch)
+
+    def __iter__(self):
+        if self.device.type != "cuda":
+            for batch in self.loader:
+                yield self._to_device(batch)
+            return
+
+        stream = torch.cuda.Stream(self.device)
+        next_batch = None
+        for batch in self.loader:
+            with torch.cuda.stream(stream):
+                batch = self._to_device(batch)
+            if next_batch is not None:
+                yield next_batch
+            # 计算流要等拷贝流把这个批次拷完；record_stream 防止显存在拷贝流上被提前回收
+            torch.cuda.current_stream(self.device).wait_stream(stream)
+            for t in batch:
+                t.record_stream(torch.cuda.current_stream(self.device))
+            next_batch = batch
+        if next_batch is not None:
+            yield next_batch
+
+
+def benchmark_configs():
+    configs = [make_pipeline_config(num_workers=0)]
+    for num_workers in (1, 2, 4):
+        for prefetch_factor in (2, 4):
+            configs.append(make_pipeline_config(num_workers=num_workers, prefetch_factor=prefetch_factor))
+    return configs
+
+
+def benchmark_pipeline(dataset, batch_size, device, configs=None, batch_indexing=False, epochs=2):
+    """
+    测试各种配置下数据管道(加载 + 搬到设备)的吞吐，第一个 epoch 作为预热（包含启动子进程）不计入
+    """
+    configs = configs or benchmark_configs()
+    print(f"{'num_workers':>12}{'prefetch':>10}{'pin_memory':>12}{'样本/秒':>14}")
+    for config in configs:
+        loader = make_loader(dataset, batch_size, shuffle=True, config=config, batch_indexing=batch_indexing)
+        batches = DevicePrefetcher(loader, device, config["non_blocking"])
+        samples = 0
+        elapsed = 0.0
+        for epoch in range(epochs):
+            start = time.perf_counter()
+            for batch in batches:
+                if epoch > 0:
+                    samples += len(batch[0])
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            if epoch > 0:
+                elapsed += time.perf_counter() - start
+        pin_memory = config["pin_memory"] and torch.cuda.is_available()
+        prefetch = config["prefetch_factor"] if config["num_workers"] > 0 else "-"
+        print(f"{config['num_workers']:>12}{prefetch:>10}{str(pin_memory):>12}{samples / elapsed:>14.0f}")
+        del batches, loader
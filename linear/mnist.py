@@ -1,34 +1,74 @@
+# 单进程: python mnist.py
+# 单机多进程数据并行(gloo): torchrun --standalone --nproc-per-node 4 mnist.py
+import argparse
+import os
+
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import Dataset
+
+from ddp import barrier, cleanup_distributed, init_distributed, is_main_process
+from input_pipeline import (
+    add_pipeline_args,
+    benchmark_pipeline,
+    make_loader,
+    pipeline_config_from_args,
+)
+from profiling import add_profiling_args, profiler_from_args
+from trainer import Trainer, add_trainer_args, select_device, trainer_config_from_args
+
+MNIST_MEAN = 0.1307
+MNIST_STD = 0.3081
+# 像素只有 0~255 共 256 种取值，预先算好每个取值归一化+标准化后的结果，
+# 之后对整张图片做一次查表即可，不必每次都重新做除法
+NORMALIZE_LUT = (torch.arange(256, dtype=torch.float32) / 255.0 - MNIST_MEAN) / MNIST_STD
 
 
 # 自定义数据集
 class MNISTDataset(Dataset):
     def __init__(self, file_path):
-        self.images, self.labels = self._read_file(file_path)
-
-    def _read_file(self, file_path):
-        images = []
-        labels = []
-        with open(file_path, 'r') as f:
-            next(f)  # 跳过标题行
-            for line in f:
-                items = line.strip().split(",")
-                images.append([float(x) for x in items[1:]])
-                labels.append(int(items[0]))
-        return images, labels
+        # 第一次运行时把 CSV 转成紧凑的 uint8 二进制缓存(.npy)，之后直接内存映射(mmap)该缓存，
+        # 启动时不需要解析文本，也不会为每个像素创建 Python float 对象
+        self.file_path = file_path
+        self.images, self.labels = self._load_cache(file_path)
+
+    def __getstate__(self):
+        # 传给 DataLoader 子进程时只传文件路径，子进程自己重新映射缓存文件，
+        # 避免把整个数据集序列化一遍（Windows 上子进程是 spawn 方式启动的）
+        return {"file_path": self.file_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["file_path"])
+
+    def _load_cache(self, file_path):
+        base = os.path.splitext(file_path)[0]
+        images_path = base + ".images.npy"
+        labels_path = base + ".labels.npy"
+        csv_mtime = os.path.getmtime(file_path)
+        if not all(os.path.exists(p) and os.path.getmtime(p) >= csv_mtime for p in (images_path, labels_path)):
+            self._convert(file_path, images_path, labels_path)
+        return np.load(images_path, mmap_mode='r'), np.load(labels_path, mmap_mode='r')
+
+    def _convert(self, file_path, images_path, labels_path):
+        print(f"正在把 {file_path} 转换为二进制缓存（只需一次）...")
+        data = np.loadtxt(file_path, delimiter=",", skiprows=1, dtype=np.uint8)  # 跳过标题行
+        # 先写临时文件再改名，中途中断不会留下不完整的缓存
+        for path, array in ((labels_path, data[:, 0]), (images_path, data[:, 1:])):
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, np.ascontiguousarray(array))
+            os.replace(tmp_path, path)
 
     def __getitem__(self, index):
-        image = torch.tensor(self.images[index], dtype=torch.float32).view(-1)
-        image = image / 255.0  # 归一化
-        image = (image - 0.1307) / 0.3081  # 标准化
-        label = torch.tensor(self.labels[index], dtype=torch.long)
+        # index 既可以是单个下标，也可以是一批下标（配合 batch_indexing 一次取出整个批次）
+        pixels = torch.from_numpy(self.images[index].astype(np.int64))
+        image = NORMALIZE_LUT[pixels]  # 归一化 + 标准化
+        label = torch.from_numpy(np.asarray(self.labels[index], dtype=np.int64))
         return image, label
 
     def __len__(self):
-        return len(self.images)
+        return len(self.labels)
 
 
 # 模型定义
@@ -55,48 +95,61 @@ class NeuralNetwork(nn.Module):
 batch_size = 64
 learning_rate = 0.1
 num_epochs = 10
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-
-# 数据加载
-train_dataset = MNISTDataset(r'data\mnist_train.csv')
-train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True)
-test_dataset = MNISTDataset(r"data\mnist_test.csv")
-test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
-
-# 模型、损失函数、优化器
-model = NeuralNetwork().to(device)
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.SGD(model.parameters(), lr=learning_rate)
-
-# 训练过程
-model.train()
-for epoch in range(num_epochs):
-    total_loss = 0
-    for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)
-
-        outputs = model(images)
-        loss = criterion(outputs, labels)
-
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-
-        total_loss += loss.item()
-
-    avg_loss = total_loss / len(train_loader)
-    print(f"Epoch {epoch+1}/{num_epochs}, Loss: {avg_loss:.4f}")
-
-# 测试过程
-model.eval()
-correct = 0
-total = 0
-with torch.no_grad():
-    for images, labels in test_loader:
-        images, labels = images.to(device), labels.to(device)
-        outputs = model(images)
-        preds = torch.argmax(outputs, dim=1)
-        correct += (preds == labels).sum().item()
-        total += labels.size(0)
-
-print(f"Test Accuracy: {100 * correct / total:.2f}%")
\ No newline at end of file
+CHECKPOINT_PATH = r"data\mnist_checkpoint.pt"
+
+
+def count_correct(outputs, labels):
+    return (torch.argmax(outputs, dim=1) == labels).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MNIST 全连接网络训练")
+    add_pipeline_args(parser)
+    add_trainer_args(parser)
+    add_profiling_args(parser)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="检查点文件路径")
+    parser.add_argument("--checkpoint-interval", type=int, default=1, help="每隔多少个 epoch 保存一次检查点")
+    parser.add_argument("--resume", action="store_true", help="从检查点继续训练")
+    args = parser.parse_args()
+    pipeline_config = pipeline_config_from_args(args)
+    trainer_config = trainer_config_from_args(args)
+    _, world_size = init_distributed()
+    distributed = world_size > 1
+
+    # 数据加载：由 0 号进程先生成二进制缓存，其余进程等它完成后直接映射，避免多个进程同时写缓存
+    if not is_main_process():
+        barrier()
+    train_dataset = MNISTDataset(r'data\mnist_train.csv')
+    test_dataset = MNISTDataset(r"data\mnist_test.csv")
+    if is_main_process():
+        barrier()
+    if args.benchmark:
+        benchmark_pipeline(train_dataset, batch_size, select_device(trainer_config["device"]), batch_indexing=True)
+        return
+    # batch_size 是每个进程的批大小，多进程时全局批大小为 batch_size * world_size
+    train_loader = make_loader(train_dataset, batch_size, shuffle=True, config=pipeline_config,
+                               batch_indexing=True, distributed=distributed)
+    test_loader = make_loader(test_dataset, batch_size, config=pipeline_config,
+                              batch_indexing=True, distributed=distributed, evaluation=True)
+
+    # 模型、损失函数、优化器
+    model = NeuralNetwork()
+    optimizer = optim.SGD(model.parameters(), lr=learning_rate)
+    trainer = Trainer(model, nn.CrossEntropyLoss(), optimizer, correct_fn=count_correct,
+                      config=trainer_config, non_blocking=pipeline_config["non_blocking"],
+                      profiler=profiler_from_args(args))
+
+    # 训练过程
+    trainer.fit(train_loader, num_epochs, checkpoint_path=args.checkpoint,
+                checkpoint_interval=args.checkpoint_interval, resume=args.resume)
+    trainer.profiler.close()
+
+    # 测试过程
+    metrics = trainer.evaluate(test_loader)
+    if is_main_process():
+        print(f"Test Accuracy: {100 * metrics['accuracy']:.2f}%")
+    cleanup_distributed()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class TabularPreprocessor:
+    """
+    可拟合、可保存的表格特征预处理：
+      - 数值列：标准化 (x - mean) / std，均值和标准差用 Welford 算法分块流式统计，CSV 再大也只需读一遍
+      - 类别列：记录出现过的类别，转换时做 one-hot，未见过的类别编码为全 0
+    训练、验证、推理共用同一份保存下来的统计量，不需要重新读取训练集。
+    """
+
+    def __init__(self, numeric_columns, categorical_columns, label_column=None, required_columns=()):
+        """
+        :param numeric_columns: 需要标准化的数值列
+        :param categorical_columns: 需要 one-hot 编码的类别列
+        :param label_column: 标签列，推理数据中可以没有
+        :param required_columns: 这些列有缺失值的行会被丢弃
+        """
+        self.numeric_columns = list(numeric_columns)
+        self.categorical_columns = list(categorical_columns)
+        self.label_column = label_column
+        self.required_columns = list(required_columns)
+        self.count = np.zeros(len(self.numeric_columns))
+        self.mean = np.zeros(len(self.numeric_columns))
+        self.m2 = np.zeros(len(self.numeric_columns))
+        self.categories = {column: [] for column in self.categorical_columns}
+
+    @property
+    def std(self):
+        # 样本标准差(ddof=1)，与 pandas 的 DataFrame.std() 一致
+        return np.sqrt(self.m2 / np.maximum(self.count - 1, 1))
+
+    @property
+    def feature_names(self):
+        names = list(self.numeric_columns)
+        for column in self.categorical_columns:
+            names.extend(f"{column}_{value}" for value in self.categories[column])
+        return names
+
+    def _clean(self, df):
+        return df.dropna(subset=self.required_columns) if self.required_columns else df
+
+    def fit(self, file_path, chunksize=100_000):
+        """
+        分块读取 CSV，一遍完成统计
+        """
+        seen = {column: set() for column in self.categorical_columns}
+        for chunk in pd.read_csv(file_path, chunksize=chunksize):
+            self.partial_fit(chunk, seen)
+        # 类别排序后固定下来，保证 one-hot 列的顺序稳定（与 pd.get_dummies 一致）
+        self.categories = {column: sorted(values) for column, values in seen.items()}
+        return self
+
+    def partial_fit(self, df, seen):
+        df = self._clean(df)
+        values = df[self.numeric_columns].to_numpy(dtype=np.float64)
+        # 按列合并本块的 (count, mean, M2) 到累计值（Welford/Chan 并行合并公式），缺失值不参与统计
+        chunk_count = np.sum(~np.isnan(values), axis=0)
+        with np.errstate(invalid='ignore'):
+            chunk_mean = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros_like(self.mean)
+        chunk_m2 = np.nansum((values - chunk_mean) ** 2, axis=0)
+        total = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        safe_total = np.maximum(total, 1)
+        self.mean = self.mean + delta * chunk_count / safe_total
+        self.m2 = self.m2 + chunk_m2 + delta ** 2 * self.count * chunk_count / safe_total
+        self.count = total
+        for column in self.categorical_columns:
+            seen[column].update(df[column].dropna().astype(str).unique())
+
+    def transform(self, df):
+        """
+        :return: (特征数组 float32, 标签数组 float32 或 None)
+        """
+        df = self._clean(df)
+        numeric = df[self.numeric_columns].to_numpy(dtype=np.float64)
+        std = self.std
+        numeric = (numeric - self.mean) / np.where(std > 0, std, 1.0)
+        parts = [np.nan_to_num(numeric)]  # 数值缺失值填为均值（标准化后即 0）
+        for column in self.categorical_columns:
+            codes = pd.Categorical(df[column].astype("string"), categories=self.categories[column]).codes
+            one_hot = np.zeros((len(df), len(self.categories[column])))
+            rows = np.flatnonzero(codes >= 0)
+            one_hot[rows, codes[rows]] = 1.0
+            parts.append(one_hot)
+        features = np.hstack(parts).astype(np.float32)
+
+        labels = None
+        if self.label_column is not None and self.label_column in df.columns:
+            labels = df[self.label_column].to_numpy(dtype=np.float32)
+        return features, labels
+
+    def transform_csv(self, file_path, chunksize=100_000):
+        """
+        分块读取并转换 CSV，逐块产出 (特征, 标签)
+        """
+        for chunk in pd.read_csv(file_path, chunksize=chunksize):
+            yield self.transform(chunk)
+
+    def save(self, path):
+        state = {
+            "numeric_columns": self.numeric_columns,
+            "categorical_columns": self.categorical_columns,
+            "label_column": self.label_column,
+            "required_columns": self.required_columns,
+            "count": self.count.tolist(),
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "categories": self.categories,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        preprocessor = cls(state["numeric_columns"], state["categorical_columns"],
+                           state["label_column"], state["required_columns"])
+        preprocessor.count = np.array(state["count"])
+        preprocessor.mean = np.array(state["mean"])
+        preprocessor.m2 = np.array(state["m2"])
+        preprocessor.categories = state["categories"]
+        return preprocessor
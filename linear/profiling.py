@@ -0,0 +1,175 @@
+import contextlib
+import json
+import os
+import time
+
+import torch
+
+from ddp import get_rank, get_world_size, is_main_process
+
+# 训练步骤中计时的阶段，按发生顺序排列
+PHASES = ("data", "forward", "backward", "optimizer")
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def add_profiling_args(parser):
+    parser.add_argument("--profile", action="store_true", help="记录每个阶段(取数/前向/反向/优化器)的耗时并输出汇总")
+    parser.add_argument("--profile-trace-steps", type=int, default=0,
+                        help="用 torch.profiler 记录这么多步并导出 Chrome trace，0 表示不记录")
+    parser.add_argument("--profile-trace-start", type=int, default=5, help="从第几步开始记录 trace（跳过启动阶段）")
+    parser.add_argument("--profile-dir", default="profile", help="汇总 JSON 和 trace 的输出目录")
+
+
+def profiler_from_args(args):
+    return StepProfiler(
+        enabled=args.profile or args.profile_trace_steps > 0,
+        trace_steps=args.profile_trace_steps,
+        trace_start=args.profile_trace_start,
+        output_dir=args.profile_dir,
+    )
+
+
+class StepProfiler:
+    """
+    训练步骤计时：分阶段累计墙钟时间和处理的样本数，可选地用 torch.profiler 记录一段步骤并导出 Chrome trace。
+    未启用时 phase() 返回同一个空上下文、iterate() 原样返回，开销可以忽略。
+    启用时每个阶段结束都会同步一次 GPU，计时才准确，但会打断异步执行，只在分析性能时打开。
+    """
+
+    def __init__(self, enabled=False, trace_steps=0, trace_start=5, output_dir="profile"):
+        """
+        :param trace_steps: 用 torch.profiler 记录的步数，0 表示不记录
+        :param trace_start: 从第几步开始记录（前面几步通常包含启动子进程、编译等一次性开销）
+        """
+        self.enabled = enabled
+        self.trace_steps = trace_steps
+        self.trace_start = trace_start
+        self.output_dir = output_dir
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+        self.samples = 0
+        self.elapsed = 0.0
+        self._last = None
+        self._torch_profiler = None
+        if enabled and trace_steps > 0:
+            os.makedirs(output_dir, exist_ok=True)
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._torch_profiler = torch.profiler.profile(
+                activities=activities,
+                schedule=torch.profiler.schedule(wait=trace_start, warmup=1, active=trace_steps, repeat=1),
+                on_trace_ready=self._export_trace,
+                record_shapes=True,
+            )
+            self._torch_profiler.start()
+
+    def _suffix(self):
+        # 多进程训练时每个进程各写一份，文件名带上 rank
+        return f".rank{get_rank()}" if get_world_size() > 1 else ""
+
+    def _export_trace(self, profiler):
+        trace_path = os.path.join(self.output_dir, f"trace{self._suffix()}.json")
+        profiler.export_chrome_trace(trace_path)
+        table_path = os.path.join(self.output_dir, f"operators{self._suffix()}.txt")
+        with open(table_path, 'w', encoding='utf-8') as f:
+            f.write(profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=30))
+        print(f"📝 trace 已导出到 {trace_path}（可在 chrome://tracing 或 https://ui.perfetto.dev 打开）")
+
+    @staticmethod
+    def _synchronize():
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            torch.cuda.synchronize()
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        with torch.profiler.record_function(name) if self._torch_profiler else _NULL_CONTEXT:
+            start = time.perf_counter()
+            yield
+            self._synchronize()
+            self.totals[name] += time.perf_counter() - start
+
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed(name)
+
+    def iterate(self, batches):
+        """
+        包装批次迭代器，把等待下一个批次的时间记为 data 阶段
+        """
+        if not self.enabled:
+            return batches
+        return self._iterate(batches)
+
+    def _iterate(self, batches):
+        iterator = iter(batches)
+        self._last = time.perf_counter()
+        while True:
+            with self.phase("data"):
+                batch = next(iterator, None)
+            if batch is None:
+                return
+            yield batch
+
+    def step(self, samples):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.elapsed += now - self._last
+        self._last = now
+        self.steps += 1
+        self.samples += samples
+        if self._torch_profiler is not None:
+            self._torch_profiler.step()
+
+    def summary(self):
+        elapsed = max(self.elapsed, 1e-9)
+        phases = {}
+        for name, total in self.totals.items():
+            phases[name] = {
+                "total_s": total,
+                "mean_ms": total / max(self.steps, 1) * 1000,
+                "percent": total / elapsed * 100,
+            }
+        # 不属于以上任何阶段的时间：指标统计、日志、Python 循环本身等
+        other = max(self.elapsed - sum(self.totals.values()), 0.0)
+        phases["other"] = {
+            "total_s": other,
+            "mean_ms": other / max(self.steps, 1) * 1000,
+            "percent": other / elapsed * 100,
+        }
+        return {
+            "steps": self.steps,
+            "samples": self.samples,
+            "elapsed_s": self.elapsed,
+            "steps_per_second": self.steps / elapsed,
+            "samples_per_second": self.samples / elapsed,
+            "phases": phases,
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\n⏱️ 共 {summary['steps']} 步，{summary['elapsed_s']:.2f}s，"
+              f"{summary['steps_per_second']:.1f} 步/秒，{summary['samples_per_second']:.0f} 样本/秒")
+        print(f"{'阶段':<12}{'总耗时(s)':>12}{'每步(ms)':>12}{'占比':>8}")
+        for name, stats in summary["phases"].items():
+            print(f"{name:<12}{stats['total_s']:>12.3f}{stats['mean_ms']:>12.3f}{stats['percent']:>7.1f}%")
+
+    def close(self):
+        """
+        停止 torch.profiler，打印汇总并导出 summary.json
+        """
+        if not self.enabled:
+            return
+        if self._torch_profiler is not None:
+            self._torch_profiler.stop()
+            self._torch_profiler = None
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary_path = os.path.join(self.output_dir, f"summary{self._suffix()}.json")
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        if is_main_process():
+            self.print_summary()
+            print(f"📝 阶段耗时汇总已保存到 {summary_path}")
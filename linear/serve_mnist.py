@@ -0,0 +1,129 @@
+# MNIST 本地推理服务：启动时加载一次检查点，请求经动态微批处理合并后一起推理
+# 用法示例:
+#   python serve_mnist.py --port 8000
+#   curl -X POST localhost:8000/predict -d '{"pixels": [0, 0, ..., 255]}'   # 784 个 0~255 的像素值
+#   python serve_mnist.py --benchmark 5000 --concurrency 64              # 对比逐条推理与微批推理的吞吐
+#   python serve_mnist.py --int8                                          # 使用 export_mnist.py 导出的 int8 模型
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+
+from export_mnist import INT8_MODEL_PATH
+from inference import MicroBatcher
+from mnist import CHECKPOINT_PATH, NORMALIZE_LUT, NeuralNetwork
+
+
+def load_model(checkpoint_path):
+    state = torch.load(checkpoint_path, map_location="cpu", weights_only=True)
+    model = NeuralNetwork()
+    model.load_state_dict(state["model"])
+    model.eval()
+    print(f"✅ 已加载检查点 {checkpoint_path}（训练了 {state['epoch']} 个 epoch）")
+    return model
+
+
+def make_predict_fn(model):
+    @torch.inference_mode()
+    def predict(images):
+        probabilities = torch.softmax(model(images), dim=1)
+        labels = torch.argmax(probabilities, dim=1)
+        return [{"label": label, "probabilities": probs}
+                for label, probs in zip(labels.tolist(), probabilities.tolist())]
+    return predict
+
+
+def preprocess(pixels):
+    pixels = torch.as_tensor(pixels, dtype=torch.long)
+    if pixels.shape != (28 * 28,) or pixels.min() < 0 or pixels.max() > 255:
+        raise ValueError("pixels 必须是 784 个 0~255 的整数")
+    return NORMALIZE_LUT[pixels]
+
+
+def make_handler(batcher):
+    class PredictHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/predict":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                image = preprocess(body["pixels"])
+            except (KeyError, TypeError, ValueError) as e:
+                self._reply(400, {"error": str(e)})
+                return
+            try:
+                result = batcher.predict(image)
+            except Exception as e:
+                # 推理出错（或服务正在关闭）时返回 500，而不是直接断开连接
+                self._reply(500, {"error": str(e)})
+                return
+            self._reply(200, result)
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # 不逐条打印访问日志
+
+    return PredictHandler
+
+
+def benchmark(predict_fn, requests, concurrency, max_batch_size, max_wait_ms):
+    images = NORMALIZE_LUT[torch.randint(0, 256, (requests, 28 * 28))]
+    batcher = MicroBatcher(predict_fn, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(batcher.predict, images))
+        elapsed = time.perf_counter() - start
+    batcher.close()
+    stats = batcher.stats()
+    print(f"max_batch_size={max_batch_size:<5}{requests / elapsed:>10.0f} 条/秒，平均批大小 {stats['avg_batch_size']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MNIST 推理服务")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--int8", action="store_true", help=f"加载 int8 量化模型 {INT8_MODEL_PATH}（先运行 export_mnist.py）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--benchmark", type=int, metavar="N", help="不启动服务，用 N 条随机请求测试吞吐")
+    parser.add_argument("--concurrency", type=int, default=64, help="测试时的并发请求数")
+    args = parser.parse_args()
+
+    if args.int8:
+        model = torch.jit.load(INT8_MODEL_PATH)
+        print(f"✅ 已加载 int8 模型 {INT8_MODEL_PATH}")
+    else:
+        model = load_model(args.checkpoint)
+    predict_fn = make_predict_fn(model)
+    if args.benchmark:
+        benchmark(predict_fn, args.benchmark, args.concurrency, 1, 0)
+        benchmark(predict_fn, args.benchmark, args.concurrency, args.max_batch_size, args.max_wait_ms)
+        return
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(batcher))
+    print(f"🚀 推理服务已启动: http://{args.host}:{args.port}/predict")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("再见！")
+    finally:
+        server.server_close()
+        batcher.close()
+        print(f"📈 微批统计: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,23 @@
-from torch.utils.data import Dataset, DataLoader
+# 单进程: python titanic.py
+# 单机多进程数据并行(gloo): torchrun --standalone --nproc-per-node 4 titanic.py
+import argparse
+import os
+
+from torch.utils.data import Dataset
 import torch
 import torch.nn as nn
-import pandas as pd
+import numpy as np
+
+from ddp import barrier, cleanup_distributed, init_distributed, is_main_process
+from input_pipeline import (
+    add_pipeline_args,
+    benchmark_pipeline,
+    make_loader,
+    pipeline_config_from_args,
+)
+from preprocessing import TabularPreprocessor
+from profiling import add_profiling_args, profiler_from_args
+from trainer import Trainer, add_trainer_args, select_device, trainer_config_from_args
 
 class LogisticRegressionModel(nn.Module):
     def __init__(self, input_dim):
@@ -12,93 +28,111 @@ class LogisticRegressionModel(nn.Module):
         return torch.sigmoid(self.linear(x))  # Logistic Regression 输出概率
 
 
+# Titanic 数据集的特征定义：数值列做标准化，类别列做 one-hot，Age 缺失的行丢弃
+TITANIC_COLUMNS = {
+    "numeric_columns": ["Pclass", "Age", "SibSp", "Parch", "Fare"],
+    "categorical_columns": ["Sex", "Embarked"],
+    "label_column": "Survived",
+    "required_columns": ["Age"],
+}
+PREPROCESSOR_PATH = r"data\titanic_preprocessor.json"
+TRAIN_PATH = r"data\train.csv"
+VALIDATION_PATH = r"data\validation.csv"
+
+
 class TitanicDataset(Dataset):
-    def __init__(self, file_path):
+    def __init__(self, file_path, preprocessor):
+        """
+        :param preprocessor: 已在训练集上拟合好的 TabularPreprocessor，训练集和验证集必须共用同一个
+        """
         self.file_path = file_path
-        self.mean = {
-            "Pclass": 2.236695,
-            "Age": 29.699118,
-            "SibSp": 0.512605,
-            "Parch": 0.431373,
-            "Fare": 34.694514,
-            "Sex_female": 0.365546,
-            "Sex_male": 0.634454,
-            "Embarked_C": 0.182073,
-            "Embarked_Q": 0.039216,
-            "Embarked_S": 0.775910
-        }
-
-        self.std = {
-            "Pclass": 0.838250,
-            "Age": 14.526497,
-            "SibSp": 0.929783,
-            "Parch": 0.853289,
-            "Fare": 52.918930,
-            "Sex_female": 0.481921,
-            "Sex_male": 0.481921,
-            "Embarked_C": 0.386175,
-            "Embarked_Q": 0.194244,
-            "Embarked_S": 0.417274
-        }
-
-        self.data = self._load_data()
-        self.feature_size = len(self.data.columns) - 1
-
-    def _load_data(self):
-        df = pd.read_csv(self.file_path)
-        df = df.drop(columns=["PassengerId", "Name", "Ticket", "Cabin"]) ##删除不用的列
-        df = df.dropna(subset=["Age"])##删除Age有缺失的行
-        df = pd.get_dummies(df, columns=["Sex", "Embarked"], dtype=int)##进行one-hot编码
-
-        ##进行数据的标准化
-        base_features = ["Pclass", "Age", "SibSp", "Parch", "Fare"]
-        for i in range(len(base_features)):
-            df[base_features[i]] = (df[base_features[i]] - self.mean[base_features[i]]) / self.std[base_features[i]]
-        return df
+        self.preprocessor = preprocessor
+        # 分块读取并做向量化转换，最后一次性拼成连续存储的张量，取样本时只做张量索引
+        features, labels = zip(*preprocessor.transform_csv(file_path))
+        self.features = torch.from_numpy(np.concatenate(features)).contiguous()
+        self.labels = torch.from_numpy(np.concatenate(labels))
+        self.feature_size = self.features.shape[1]
 
     def __len__(self):
-        return len(self.data)
+        return len(self.labels)
 
     def __getitem__(self, idx):
-        features = self.data.drop(columns=["Survived"]).iloc[idx].values
-        label = self.data["Survived"].iloc[idx]
-        return torch.tensor(features, dtype=torch.float32), torch.tensor(label, dtype=torch.float32)
-
-train_dataset = TitanicDataset(r"data\train.csv")
-validation_dataset = TitanicDataset(r"data\validation.csv")
-
-model = LogisticRegressionModel(train_dataset.feature_size)
-model.to("cuda")
-model.train()
-
-optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
-
-epochs = 100
-
-for epoch in range(epochs):
-    correct = 0
-    step = 0
-    total_loss = 0
-    for features, labels in DataLoader(train_dataset, batch_size=256, shuffle=True):
-        step += 1
-        features = features.to("cuda")
-        labels = labels.to("cuda")
-        optimizer.zero_grad()
-        outputs = model(features).squeeze()
-        correct += torch.sum(((outputs >= 0.5) == labels))
-        loss = torch.nn.functional.binary_cross_entropy(outputs, labels)
-        total_loss += loss.item()
-        loss.backward()
-        optimizer.step()
-    print(f'Epoch {epoch + 1}, Loss: {total_loss/step:.4f}')
-    print(f'Training Accuracy: {correct / len(train_dataset)}')
-
-model.eval()
-with torch.no_grad():
-    correct = 0
-    for features, labels in DataLoader(validation_dataset, batch_size=256):
-        features = features.to("cuda")
-        labels = labels.to("cuda")
-        outputs = model(features).squeeze()
-        correct += torch.sum(((outputs >= 0.5) == labels))
-    print(f'Validation Accuracy: {correct / len(validation_dataset)}')
\ No newline at end of file
+        # idx 既可以是单个下标，也可以是一批下标（配合 make_loader(batch_indexing=True) 一次取出整个批次）
+        return self.features[idx], self.labels[idx]
+
+
+def binary_cross_entropy(outputs, labels):
+    # squeeze(-1) 而不是 squeeze()：最后一个批次只有一个样本时也保持一维
+    return torch.nn.functional.binary_cross_entropy(outputs.squeeze(-1), labels)
+
+
+def count_correct(outputs, labels):
+    return ((outputs.squeeze(-1) >= 0.5) == labels).sum()
+
+
+def load_or_fit_preprocessor(refit=False):
+    """
+    已保存过预处理参数时直接加载，不再读取训练集做统计；不存在或指定 refit 时在训练集上重新拟合并保存。
+    多进程时只由 0 号进程拟合并写文件，其余进程等它写完后加载同一份文件
+    """
+    if not is_main_process():
+        barrier()
+        return TabularPreprocessor.load(PREPROCESSOR_PATH)
+    if not refit and os.path.exists(PREPROCESSOR_PATH):
+        print(f"📂 加载已保存的预处理参数: {PREPROCESSOR_PATH}")
+        preprocessor = TabularPreprocessor.load(PREPROCESSOR_PATH)
+    else:
+        # 在训练集上一遍流式统计出标准化参数和类别表
+        preprocessor = TabularPreprocessor(**TITANIC_COLUMNS).fit(TRAIN_PATH)
+        preprocessor.save(PREPROCESSOR_PATH)
+        print(f"💾 预处理参数已保存到: {PREPROCESSOR_PATH}")
+    barrier()
+    return preprocessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Titanic 逻辑回归训练")
+    parser.add_argument("--refit", action="store_true",
+                        help="忽略已保存的预处理参数，在训练集上重新拟合（训练集有变化时使用）")
+    add_pipeline_args(parser)
+    add_trainer_args(parser)
+    add_profiling_args(parser)
+    args = parser.parse_args()
+    pipeline_config = pipeline_config_from_args(args)
+    trainer_config = trainer_config_from_args(args)
+    _, world_size = init_distributed()
+    distributed = world_size > 1
+
+    # 训练集和验证集都用同一份预处理参数做转换
+    preprocessor = load_or_fit_preprocessor(args.refit)
+
+    train_dataset = TitanicDataset(TRAIN_PATH, preprocessor)
+    validation_dataset = TitanicDataset(VALIDATION_PATH, preprocessor)
+    if args.benchmark:
+        benchmark_pipeline(train_dataset, 256, select_device(trainer_config["device"]), batch_indexing=True)
+        return
+
+    model = LogisticRegressionModel(train_dataset.feature_size)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    trainer = Trainer(model, binary_cross_entropy, optimizer, correct_fn=count_correct,
+                      config=trainer_config, non_blocking=pipeline_config["non_blocking"],
+                      profiler=profiler_from_args(args))
+
+    epochs = 100
+
+    train_loader = make_loader(train_dataset, 256, shuffle=True, config=pipeline_config,
+                               batch_indexing=True, distributed=distributed)
+    validation_loader = make_loader(validation_dataset, 256, config=pipeline_config,
+                                    batch_indexing=True, distributed=distributed, evaluation=True)
+
+    trainer.fit(train_loader, epochs)
+    trainer.profiler.close()
+
+    metrics = trainer.evaluate(validation_loader)
+    if is_main_process():
+        print(f'Validation Accuracy: {metrics["accuracy"]}')
+    cleanup_distributed()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import contextlib
+import os
+
+import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+
+from ddp import barrier, get_world_size, is_main_process
+from input_pipeline import DevicePrefetcher, set_epoch
+from profiling import StepProfiler
+
+# 训练引擎默认配置
+DEFAULT_TRAINER_CONFIG = {
+    "device": "auto",          # auto: 有 CUDA 用 GPU，否则退回 CPU
+    "compile": False,          # 用 torch.compile 编译 前向 + 损失 这一步
+    "bf16": False,             # 前向计算使用 bf16 自动混合精度（CPU 和 GPU 都支持）
+    "accumulation_steps": 1,   # 梯度累积：每累积这么多个批次才更新一次参数
+    "log_interval": 0,         # 每隔多少步把指标读回主机并打印一次，0 表示只在 epoch 结束时读取
+}
+
+
+def make_trainer_config(**overrides):
+    unknown = set(overrides) - set(DEFAULT_TRAINER_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的训练参数: {sorted(unknown)}")
+    config = dict(DEFAULT_TRAINER_CONFIG)
+    config.update(overrides)
+    if config["accumulation_steps"] < 1:
+        raise ValueError(f"accumulation_steps 必须 >= 1，当前为 {config['accumulation_steps']}")
+    return config
+
+
+def add_trainer_args(parser):
+    parser.add_argument("--device", default=DEFAULT_TRAINER_CONFIG["device"], help="auto / cpu / cuda / cuda:1 ...")
+    parser.add_argument("--compile", action="store_true", help="使用 torch.compile 编译训练步骤")
+    parser.add_argument("--bf16", action="store_true", help="使用 bf16 自动混合精度")
+    parser.add_argument("--accumulation-steps", type=int, default=DEFAULT_TRAINER_CONFIG["accumulation_steps"])
+    parser.add_argument("--log-interval", type=int, default=DEFAULT_TRAINER_CONFIG["log_interval"])
+
+
+def trainer_config_from_args(args):
+    return make_trainer_config(
+        device=args.device,
+        compile=args.compile,
+        bf16=args.bf16,
+        accumulation_steps=args.accumulation_steps,
+        log_interval=args.log_interval,
+    )
+
+
+def select_device(name="auto"):
+    if name == "auto":
+        return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    device = torch.device(name)
+    if device.type == "cuda" and not torch.cuda.is_available():
+        print(f"⚠️ 没有可用的 CUDA 设备，{name} 退回到 CPU")
+        return torch.device("cpu")
+    return device
+
+
+class Trainer:
+    """
+    通用的训练引擎：负责设备选择、批次搬运、可选的 torch.compile、bf16 混合精度和梯度累积，
+    各个训练脚本只需要提供模型、损失函数、优化器和判断预测是否正确的函数。
+    在 torchrun 启动并已调用 ddp.init_distributed() 的进程中，模型自动用 DistributedDataParallel 包装，
+    指标在读取时跨进程汇总，检查点只由 0 号进程写入。
+    """
+
+    def __init__(self, model, loss_fn, optimizer, correct_fn=None, config=None, non_blocking=True, profiler=None):
+        """
+        :param loss_fn: loss_fn(outputs, labels) -> 标量损失
+        :param optimizer: 模型参数的优化器（模型搬到设备上后参数对象不变，可以先创建）
+        :param correct_fn: correct_fn(outputs, labels) -> 本批预测正确的样本数，为 None 时不统计准确率
+        :param non_blocking: 批次拷贝到设备时是否异步，通常取数据管道配置中的同名项
+        :param profiler: StepProfiler，记录训练各阶段耗时，默认不启用
+        """
+        self.config = config or DEFAULT_TRAINER_CONFIG
+        self.device = select_device(self.config["device"])
+        self.world_size = get_world_size()
+        if self.world_size > 1 and self.device.type == "cuda":
+            self.device = torch.device("cuda", int(os.environ.get("LOCAL_RANK", 0)))
+        self.module = model.to(self.device)  # 未包装的模型，用于保存/加载参数
+        self.model = self.module
+        if self.world_size > 1:
+            device_ids = [self.device.index] if self.device.type == "cuda" else None
+            self.model = DistributedDataParallel(self.module, device_ids=device_ids)
+        self.loss_fn = loss_fn
+        self.optimizer = optimizer
+        self.correct_fn = correct_fn
+        self.non_blocking = non_blocking
+        self.profiler = profiler or StepProfiler()
+        # 把 前向 + 损失 编译成一张图，反向由 AOTAutograd 一并生成
+        self._step_fn = torch.compile(self._forward_loss) if self.config["compile"] else self._forward_loss
+
+    def _forward_loss(self, features, labels, model=None):
+        # 只有模型前向走混合精度，损失在 float32 下计算（二分类交叉熵等损失在 autocast 下不安全）
+        with self._autocast():
+            outputs = (self.model if model is None else model)(features)
+        return outputs, self.loss_fn(outputs.float(), labels)
+
+    def _autocast(self):
+        if not self.config["bf16"]:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+
+    def _batches(self, loader):
+        return DevicePrefetcher(loader, self.device, self.non_blocking)
+
+    def _new_metrics(self):
+        # 指标以张量形式留在设备上累加，每一步都调用 .item() 会强制主机等待设备算完，打断流水线
+        return {
+            "loss": torch.zeros((), device=self.device),
+            "correct": torch.zeros((), dtype=torch.long, device=self.device),
+            "samples": 0,
+            "steps": 0,
+        }
+
+    def _update_metrics(self, metrics, outputs, loss, labels):
+        metrics["loss"] += loss.detach()
+        if self.correct_fn is not None:
+            metrics["correct"] += self.correct_fn(outputs.detach(), labels)
+        metrics["samples"] += len(labels)  # 批次大小在主机上就知道，不需要同步
+        metrics["steps"] += 1
+
+    def _read_metrics(self, metrics):
+        # 唯一一次把指标拷回主机（会等待设备上排队的计算完成）
+        totals = torch.stack([
+            metrics["loss"].double(),
+            metrics["correct"].double(),
+            torch.tensor(metrics["samples"], dtype=torch.float64, device=self.device),
+            torch.tensor(metrics["steps"], dtype=torch.float64, device=self.device),
+        ])
+        if self.world_size > 1:
+            # 各进程的分片加起来就是整个数据集上的指标
+            # （训练时 DistributedSampler 为了均分会补齐少量重复样本；评估用的 ShardSampler 不补齐，结果与单进程一致）
+            dist.all_reduce(totals)
+        loss, correct, samples, steps = totals.tolist()
+        return {
+            "loss": loss / max(steps, 1),
+            "accuracy": correct / max(samples, 1) if self.correct_fn else None,
+        }
+
+    def train_epoch(self, loader):
+        """
+        训练一个 epoch
+        :return: {"loss": 平均批次损失, "accuracy": 训练准确率（没有 correct_fn 时为 None）}
+        """
+        accumulation_steps = self.config["accumulation_steps"]
+        log_interval = self.config["log_interval"]
+        self.model.train()
+        self.optimizer.zero_grad()
+        metrics = self._new_metrics()
+        profiler = self.profiler
+        batches = self._batches(loader)
+        total_steps = len(batches)
+        for features, labels in profiler.iterate(batches):
+            step = metrics["steps"] + 1
+            # 本批之后要更新参数（凑够 accumulation_steps 个批次，或者 epoch 最后一批）
+            update = step % accumulation_steps == 0 or step == total_steps
+            # 多进程时只在更新参数前的那次反向同步梯度，累积中的批次跳过 all-reduce
+            sync = contextlib.nullcontext() if update or self.world_size == 1 else self.model.no_sync()
+            with sync:
+                with profiler.phase("forward"):
+                    outputs, loss = self._step_fn(features, labels)
+                # 累积的梯度等于大批次的平均梯度
+                with profiler.phase("backward"):
+                    (loss / accumulation_steps).backward()
+            self._update_metrics(metrics, outputs, loss, labels)
+            if update:
+                with profiler.phase("optimizer"):
+                    self.optimizer.step()
+                    self.optimizer.zero_grad()
+            profiler.step(len(labels))
+            if log_interval and step % log_interval == 0:
+                loss_value = self._read_metrics(metrics)['loss']
+                if is_main_process():
+                    print(f"  step {step}, Loss: {loss_value:.4f}")
+        return self._read_metrics(metrics)
+
+    @torch.no_grad()
+    def evaluate(self, loader):
+        self.model.eval()
+        metrics = self._new_metrics()
+        for features, labels in self._batches(loader):
+            # 评估分片大小可能不同，各进程的步数不一致，直接用未包装的模型前向，不参与 DDP 的任何通信
+            outputs, loss = self._step_fn(features, labels, self.module)
+            self._update_metrics(metrics, outputs, loss, labels)
+        return self._read_metrics(metrics)
+
+    def save_checkpoint(self, path, epoch):
+        """
+        保存模型和优化器状态。先写临时文件并刷到磁盘再改名，保存过程中被中断也不会损坏已有的检查点
+        :param epoch: 已经训练完成的 epoch 数
+        """
+        # 各进程参数完全一致，只由 0 号进程写文件，其余进程等它写完
+        if is_main_process():
+            state = {
+                "epoch": epoch,
+                "model": self.module.state_dict(),
+                "optimizer": self.optimizer.state_dict(),
+            }
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                torch.save(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        barrier()
+
+    def load_checkpoint(self, path):
+        """
+        :return: 检查点中已经训练完成的 epoch 数
+        """
+        state = torch.load(path, map_location=self.device, weights_only=True)
+        self.module.load_state_dict(state["model"])
+        self.optimizer.load_state_dict(state["optimizer"])
+        return state["epoch"]
+
+    def fit(self, train_loader, epochs, checkpoint_path=None, checkpoint_interval=1, resume=False):
+        """
+        :param checkpoint_path: 检查点文件路径，为 None 时不保存
+        :param checkpoint_interval: 每隔多少个 epoch 保存一次（最后一个 epoch 总会保存）
+        :param resume: 检查点存在时从中恢复，接着训练剩下的 epoch
+        """
+        start_epoch = 0
+        if resume and checkpoint_path and os.path.exists(checkpoint_path):
+            start_epoch = self.load_checkpoint(checkpoint_path)
+            if is_main_process():
+                print(f"🔄 从检查点 {checkpoint_path} 恢复，已完成 {start_epoch} 个 epoch")
+        for epoch in range(start_epoch, epochs):
+            set_epoch(train_loader, epoch)  # 多进程时每个 epoch 换一种打乱顺序
+            metrics = self.train_epoch(train_loader)
+            message = f"Epoch {epoch + 1}/{epochs}, Loss: {metrics['loss']:.4f}"
+            if metrics["accuracy"] is not None:
+                message += f", Training Accuracy: {metrics['accuracy']:.4f}"
+            if is_main_process():
+                print(message)
+            if checkpoint_path and ((epoch + 1) % checkpoint_interval == 0 or epoch + 1 == epochs):
+                self.save_checkpoint(checkpoint_path, epoch + 1)
@@ -0,0 +1,117 @@
+# 共享的大模型客户端：所有调用通义千问（阿里云百炼 OpenAI 兼容接口）的脚本都从这里获取客户端
+#   - 进程内只创建一次，底层 HTTP 连接池和 keep-alive 连接在多次调用之间复用，
+#     不必每次请求都重新建立 TCP 连接和 TLS 握手
+#   - 连接池大小、空闲连接保持时间、连接/读取超时、重试次数都可以配置
+#   - 连接失败、超时、429 和 5xx 由 openai SDK 按指数退避自动重试
+# 其他目录下的脚本用法（先把仓库根目录加入 sys.path，共享模块 llm_client.py、chat_history.py 都在仓库根目录）:
+#   sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+#   from llm_client import get_client
+import os
+import threading
+
+DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+# 客户端默认配置
+DEFAULT_CLIENT_CONFIG = {
+    # 环境变量 DASHSCOPE_BASE_URL 可以把所有脚本指向其他地址（例如本地的测试服务）
+    "base_url": os.getenv("DASHSCOPE_BASE_URL", DASHSCOPE_BASE_URL),
+    "max_connections": 20,           # 连接池中最多同时打开的连接数
+    "max_keepalive_connections": 10, # 最多保留的空闲 keep-alive 连接数
+    "keepalive_expiry": 60.0,        # 空闲连接保留的秒数
+    "connect_timeout": 5.0,          # 建立连接的超时秒数
+    "timeout": 60.0,                 # 读取/写入超时秒数（流式输出时为两段数据之间的最长间隔）
+    "max_retries": 3,                # 失败后的最大重试次数（指数退避）
+}
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def make_client_config(**overrides):
+    unknown = set(overrides) - set(DEFAULT_CLIENT_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的客户端参数: {sorted(unknown)}")
+    config = dict(DEFAULT_CLIENT_CONFIG)
+    config.update(overrides)
+    return config
+
+
+def _api_key():
+    # 若没有配置环境变量，请用阿里云百炼API Key设置 DASHSCOPE_API_KEY
+    api_key = os.getenv('DASHSCOPE_API_KEY')
+    if not api_key or api_key == 'YOUR_DASHSCOPE_API_KEY':
+        raise ValueError("请设置环境变量 DASHSCOPE_API_KEY 或在代码中配置有效的 API Key")
+    return api_key
+
+
+def _http_options(config):
+    import httpx
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=config["max_connections"],
+            max_keepalive_connections=config["max_keepalive_connections"],
+            keepalive_expiry=config["keepalive_expiry"],
+        ),
+        "timeout": httpx.Timeout(config["timeout"], connect=config["connect_timeout"]),
+    }
+
+
+def create_client(config=None, api_key=None):
+    """
+    创建一个新的同步客户端（一般应使用 get_client() 获取共享的客户端）
+    """
+    import httpx
+    from openai import OpenAI
+
+    config = config or DEFAULT_CLIENT_CONFIG
+    return OpenAI(
+        api_key=api_key or _api_key(),
+        base_url=config["base_url"],
+        max_retries=config["max_retries"],
+        http_client=httpx.Client(**_http_options(config)),
+    )
+
+
+def get_client(**overrides):
+    """
+    获取共享的同步客户端，相同配置在进程内只创建一次（线程安全）
+    :param overrides: 覆盖 DEFAULT_CLIENT_CONFIG 中的配置项
+    """
+    config = make_client_config(**overrides)
+    key = tuple(sorted(config.items()))
+    with _lock:
+        if key not in _clients:
+            _clients[key] = create_client(config)
+        return _clients[key]
+
+
+def get_async_client(**overrides):
+    """
+    获取共享的异步客户端。连接池绑定在创建它的事件循环上，请在同一个事件循环中使用
+    """
+    import httpx
+    from openai import AsyncOpenAI
+
+    config = make_client_config(**overrides)
+    key = tuple(sorted(config.items()))
+    with _lock:
+        if key not in _async_clients:
+            _async_clients[key] = AsyncOpenAI(
+                api_key=_api_key(),
+                base_url=config["base_url"],
+                max_retries=config["max_retries"],
+                http_client=httpx.AsyncClient(**_http_options(config)),
+            )
+        return _async_clients[key]
+
+
+def close_clients():
+    """
+    关闭所有共享的同步客户端及其连接池（异步客户端需在事件循环中 await client.close()）
+    """
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
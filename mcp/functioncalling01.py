@@ -1,17 +1,16 @@
 import os
+import sys
 
-from openai import OpenAI
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_client import get_client
 
 
 def get_weather(location, date):
     return f'在{date},{location} 的天气是晴天。'
 
 def get_response(messages):
-    client = OpenAI(
-        # 若没有配置环境变量，请用阿里云百炼API Key将下行替换为：api_key="sk-xxx",
-        api_key=os.getenv("DASHSCOPE_API_KEY"),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
+    # 共享客户端复用同一个连接池，不再每次调用都重新建立连接
+    client = get_client()
     # 模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
     completion = client.chat.completions.create(model="qwen-plus", messages=messages)
     return completion
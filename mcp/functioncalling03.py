@@ -1,14 +1,19 @@
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import argparse
 import json
 import os
 import random
+import sys
+import time
 
-client = OpenAI(
-    # 若没有配置环境变量，请用百炼API Key将下行替换为：api_key="sk-xxx",
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",  # 填写DashScope SDK的base_url
-)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_client import get_client
+from streaming_tools import dispatch_tool_call, format_tool_call, run_tool_loop
+from tool_cache import ToolCache
+
+# 共享客户端（需设置环境变量 DASHSCOPE_API_KEY），多轮工具调用复用同一个连接池
+client = get_client()
 
 # 定义工具列表，模型在选择使用哪个工具时会参考工具的name和description
 tools = [
@@ -44,7 +49,12 @@ tools = [
 ]
 import requests
 
+# 高德实况天气大约每小时发布一次，缓存 10 分钟；相同城市的并发查询只请求一次接口
+WEATHER_CACHE_TTL = 600
+tool_cache = ToolCache(maxsize=256)
+
 
+@tool_cache.cached("get_current_weather", ttl=WEATHER_CACHE_TTL)
 def get_current_weather(arguments):
     # 从 JSON 中提取位置信息
     city_name = arguments["location"]
@@ -93,12 +103,59 @@ def get_current_time():
     return f"当前时间：{formatted_time}。"
 
 
+# 工具名 -> 执行函数（参数为解析后的 arguments 字典）
+TOOL_FUNCTIONS = {
+    "get_current_weather": get_current_weather,
+    "get_current_time": lambda arguments: get_current_time(),
+}
+# 每个工具的超时秒数，超时后不再等待它的结果，直接告诉模型该工具超时
+TOOL_TIMEOUTS = {
+    "get_current_weather": 10,
+    "get_current_time": 1,
+}
+DEFAULT_TOOL_TIMEOUT = 10
+# 同一轮中的多个工具调用（例如同时查询多个城市的天气）在线程池中并发执行
+tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+
+def tool_timeout(name):
+    return TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT)
+
+
+def run_tool(name, arguments):
+    function = TOOL_FUNCTIONS.get(name)
+    if function is None:
+        return f"未知的工具：{name}"
+    try:
+        arguments = json.loads(arguments) if arguments else {}
+    except json.JSONDecodeError as e:
+        return f"工具参数不是合法的 JSON：{e}"
+    result = function(arguments)
+    return result if result is not None else f"工具 {name} 执行失败"
+
+
+def run_tool_calls(tool_calls):
+    """
+    并发执行一轮中的全部工具调用，整轮耗时约等于最慢的那个工具
+    :return: 与 tool_calls 顺序一致的 tool 消息列表
+    """
+    start = time.perf_counter()
+    # 所有工具同时开始执行，超时从提交时刻算起
+    pending = [dispatch_tool_call(tool_executor, run_tool, call.id, call.function.name, call.function.arguments,
+                                  tool_timeout(call.function.name))
+               for call in tool_calls]
+    tool_messages = [tool_call.message() for tool_call in pending]
+    print(f"⏱️ 本轮 {len(tool_calls)} 个工具调用并发执行，耗时 {time.perf_counter() - start:.2f}s")
+    return tool_messages
+
+
 # 封装模型响应函数
 def get_response(messages):
     completion = client.chat.completions.create(
         model="qwen-plus",  # 模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
         messages=messages,
         tools=tools,
+        parallel_tool_calls=True,  # 允许模型在一轮中返回多个工具调用
     )
     return completion
 
@@ -130,23 +187,12 @@ def call_with_messages():
         return
     # 如果需要调用工具，则进行模型的多轮调用，直到模型判断无需调用工具
     while assistant_output.tool_calls != None:
-        # 如果判断需要调用查询天气工具，则运行查询天气工具
-        tool_info = {
-            "content": "",
-            "role": "tool",
-            "tool_call_id": assistant_output.tool_calls[0].id,
-        }
-        if assistant_output.tool_calls[0].function.name == "get_current_weather":
-            # 提取位置参数信息
-            arguments = json.loads(assistant_output.tool_calls[0].function.arguments)
-            tool_info["content"] = get_current_weather(arguments)
-        # 如果判断需要调用查询时间工具，则运行查询时间工具
-        elif assistant_output.tool_calls[0].function.name == "get_current_time":
-            tool_info["content"] = get_current_time()
-        tool_output = tool_info["content"]
-        print(f"工具输出信息：{tool_output}\n")
+        # 模型可能在一轮中请求多个工具调用（例如同时查询几个城市的天气），全部并发执行，结果按原顺序追加
+        tool_messages = run_tool_calls(assistant_output.tool_calls)
+        for tool_info in tool_messages:
+            print(f"工具输出信息：{tool_info['content']}\n")
         print("-" * 60)
-        messages.append(tool_info)
+        messages.extend(tool_messages)
         assistant_output = get_response(messages).choices[0].message
         if assistant_output.content is None:
             assistant_output.content = ""
@@ -154,7 +200,36 @@ def call_with_messages():
         i += 1
         print(f"第{i}轮大模型输出信息：{assistant_output}\n")
     print(f"最终答案：{assistant_output.content}")
+    print(f"📈 工具缓存统计: {tool_cache.stats()}")
+
+
+def call_with_messages_stream():
+    """
+    流式版本：回答边生成边输出；工具调用的参数一拼接完整就开始执行，不等模型把整段响应生成完
+    """
+    print("\n")
+    messages = [{"content": input("请输入："), "role": "user"}]
+    print("-" * 60)
+    print("模型输出：", end="", flush=True)
+    run_tool_loop(
+        client,
+        messages,
+        run_tool,
+        on_token=lambda text: print(text, end="", flush=True),
+        tool_timeout=tool_timeout,
+        executor=tool_executor,
+        on_tool_result=lambda call, content: print(f"\n🔧 {format_tool_call(call)} -> {content}"),
+        model="qwen-plus",
+        tools=tools,
+        parallel_tool_calls=True,
+    )
+    print(f"\n📈 工具缓存统计: {tool_cache.stats()}")
 
 
 if __name__ == "__main__":
-    call_with_messages()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="通义千问工具调用示例")
+    parser.add_argument("--stream", action="store_true", help="流式输出，工具参数完整后立即执行")
+    if parser.parse_args().stream:
+        call_with_messages_stream()
+    else:
+        call_with_messages()
\ No newline at end of file
@@ -1,6 +1,11 @@
 import os
+import sys
+
 from qwen_agent.agents import Assistant
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_history import ConversationHistory
+
 # LLM 配置
 llm_cfg = {
     "model": "qwen-plus-latest",
@@ -39,18 +44,19 @@ bot = Assistant(
     function_list=tools,
 )
 
-messages = []
+# 对话历史按 token 预算管理：地图、网页等工具的输出很长，加入历史时截断，超出预算时较早的对话折叠成摘要
+history = ConversationHistory()
 
 while True:
     query = input("\nuser question: ")
     if not query.strip():
         print("user question cannot be empty！")
         continue
-    messages.append({"role": "user", "content": query})
+    history.append({"role": "user", "content": query})
     bot_response = ""
     is_tool_call = False
     tool_call_info = {}
-    for response_chunk in bot.run(messages):
+    for response_chunk in bot.run(history.messages()):
         new_response = response_chunk[-1]
         if "function_call" in new_response:
             is_tool_call = True
@@ -65,4 +71,4 @@ while True:
             incremental_content = new_response["content"][len(bot_response):]
             print(incremental_content, end="", flush=True)
             bot_response += incremental_content
-    messages.extend(response_chunk)
\ No newline at end of file
+    history.extend(response_chunk)
\ No newline at end of file
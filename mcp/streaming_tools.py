@@ -0,0 +1,163 @@
+# 流式工具调用：大模型以 stream=True 返回，
+#   - 最终回答的文本一到就交给调用方输出，不必等整段生成完
+#   - tool_calls 的参数是分段返回的，在这里按 index 逐段拼接；某个工具调用的参数一拼完整
+#     （开始返回下一个工具调用，或整个响应结束）就立即提交到线程池执行，和模型继续生成后面的内容重叠
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+DEFAULT_TOOL_TIMEOUT = 10
+
+
+class PendingToolCall:
+    """
+    已提交、正在执行的工具调用
+    """
+
+    def __init__(self, call_id, name, future, timeout):
+        self.call_id = call_id
+        self.name = name
+        self.future = future
+        self.timeout = timeout
+        # 超时从提交时刻算起，同时提交的工具调用各自独立计时
+        self.deadline = time.perf_counter() + timeout
+
+    def result(self):
+        """
+        :return: 工具输出文本；超时或出错时返回说明文字，交给模型处理
+        """
+        try:
+            return self.future.result(timeout=max(self.deadline - time.perf_counter(), 0))
+        except FutureTimeoutError:
+            return f"工具 {self.name} 执行超时（{self.timeout}s）"
+        except Exception as e:
+            return f"工具 {self.name} 执行出错：{e}"
+
+    def message(self):
+        return {"content": self.result(), "role": "tool", "tool_call_id": self.call_id}
+
+
+def dispatch_tool_call(executor, execute_tool, call_id, name, arguments, timeout=DEFAULT_TOOL_TIMEOUT):
+    """
+    :param execute_tool: execute_tool(name, arguments) -> 工具输出文本，arguments 为 JSON 字符串
+    """
+    return PendingToolCall(call_id, name, executor.submit(execute_tool, name, arguments), timeout)
+
+
+class ToolCallAssembler:
+    """
+    拼接流式返回的 tool_calls 增量：id 和函数名通常只在第一段出现，arguments 分多段返回
+    """
+
+    def __init__(self, on_complete=None):
+        """
+        :param on_complete: on_complete(call) 在某个工具调用的参数拼接完整时调用
+        """
+        self.on_complete = on_complete
+        self.calls = []      # 按出现顺序排列的 {"id", "type", "function": {"name", "arguments"}}
+        self._by_index = {}
+        self._current = None
+        self._completed = set()
+
+    def feed(self, deltas):
+        for delta in deltas:
+            index = delta.index if delta.index is not None else (self._current or 0)
+            if index not in self._by_index:
+                # 开始返回下一个工具调用，说明上一个的参数已经完整
+                if self._current is not None:
+                    self._complete(self._current)
+                call = {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+                self._by_index[index] = call
+                self.calls.append(call)
+                self._current = index
+            call = self._by_index[index]
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function is not None:
+                if delta.function.name:
+                    call["function"]["name"] = delta.function.name
+                if delta.function.arguments:
+                    call["function"]["arguments"] += delta.function.arguments
+
+    def _complete(self, index):
+        if index in self._completed:
+            return
+        self._completed.add(index)
+        if self.on_complete is not None:
+            self.on_complete(self._by_index[index])
+
+    def finish(self):
+        for index in self._by_index:
+            self._complete(index)
+
+
+def stream_chat(client, messages, on_token=None, on_tool_call=None, **create_kwargs):
+    """
+    流式调用一次大模型
+    :param on_token: on_token(text) 每收到一段回答文本调用一次
+    :param on_tool_call: on_tool_call(call) 每个工具调用的参数完整时调用一次
+    :return: 可直接追加到 messages 的 assistant 消息
+    """
+    stream = client.chat.completions.create(messages=messages, stream=True, **create_kwargs)
+    content = []
+    assembler = ToolCallAssembler(on_tool_call)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+            if on_token is not None:
+                on_token(delta.content)
+        if delta.tool_calls:
+            assembler.feed(delta.tool_calls)
+    assembler.finish()
+    message = {"role": "assistant", "content": "".join(content)}
+    if assembler.calls:
+        message["tool_calls"] = assembler.calls
+    return message
+
+
+def run_tool_loop(client, messages, execute_tool, on_token=None, tool_timeout=DEFAULT_TOOL_TIMEOUT,
+                  executor=None, max_rounds=10, on_tool_result=None, **create_kwargs):
+    """
+    流式的多轮工具调用：反复调用模型、执行它请求的工具，直到模型给出最终回答
+    :param execute_tool: execute_tool(name, arguments) -> 工具输出文本，arguments 为 JSON 字符串
+    :param tool_timeout: 超时秒数，或 tool_timeout(name) -> 秒数
+    :param on_tool_result: on_tool_result(call, content) 每个工具结果就绪时调用，可用来打印
+    :return: 最终回答文本（messages 中追加了全部中间消息）
+    """
+    own_executor = executor is None
+    executor = executor or ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+    try:
+        for _ in range(max_rounds):
+            pending = []
+
+            def dispatch(call):
+                name = call["function"]["name"]
+                timeout = tool_timeout(name) if callable(tool_timeout) else tool_timeout
+                pending.append((call, dispatch_tool_call(executor, execute_tool, call["id"], name,
+                                                         call["function"]["arguments"], timeout)))
+
+            message = stream_chat(client, messages, on_token=on_token, on_tool_call=dispatch, **create_kwargs)
+            messages.append(message)
+            if not pending:
+                return message["content"]
+            for call, tool_call in pending:
+                tool_message = tool_call.message()
+                if on_tool_result is not None:
+                    on_tool_result(call, tool_message["content"])
+                messages.append(tool_message)
+        raise RuntimeError(f"超过 {max_rounds} 轮工具调用仍未得到最终回答")
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+def format_tool_call(call):
+    # 打印用：函数名(参数)
+    try:
+        arguments = json.dumps(json.loads(call["function"]["arguments"] or "{}"), ensure_ascii=False)
+    except json.JSONDecodeError:
+        arguments = call["function"]["arguments"]
+    return f"{call['function']['name']}({arguments})"
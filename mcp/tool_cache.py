@@ -0,0 +1,105 @@
+# 工具结果缓存：外部接口（高德天气、Open-Meteo 等）的数据几分钟才更新一次，没必要每次工具调用都请求
+#   - 以 工具名 + 规范化后的参数 为键，每个工具单独设置过期时间(TTL)，总条数有上限，超出后淘汰最久未使用的
+#   - 单飞(single-flight)：相同参数的并发请求只有第一个真正调用接口，其余的等待并共享它的结果
+#   - 失败的结果（返回 None 或抛出异常）不缓存，下次调用会重新请求
+import functools
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def normalize_arguments(arguments):
+    # 参数顺序无关；字符串做全角/半角统一、去掉多余空白、英文转小写，使“同一个请求”命中同一条缓存
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(unicodedata.normalize('NFKC', value).split()).lower()
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [normalize(v) for v in value]
+        return value
+    return json.dumps(normalize(arguments or {}), sort_keys=True, ensure_ascii=False)
+
+
+class ToolCache:
+    """
+    线程安全的工具结果缓存（TTL + LRU + 请求合并）
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0       # 真正调用外部接口的次数
+        self.coalesced = 0    # 等待其他线程进行中的相同请求、没有重复调用接口的次数
+        self._data = OrderedDict()  # key -> (结果, 过期时间戳)
+        self._inflight = {}         # key -> Future，正在调用接口的请求
+        self._lock = threading.Lock()
+
+    def call(self, name, arguments, function, ttl):
+        """
+        :param function: function(arguments) -> 结果，返回 None 表示失败
+        :param ttl: 结果的有效秒数
+        """
+        key = (name, normalize_arguments(arguments))
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = function(arguments)
+        except BaseException as e:
+            # 异常同样通知给正在等待的线程，避免它们一直阻塞
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            if result is not None:
+                self._data[key] = (result, time.monotonic() + ttl)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        future.set_result(result)
+        return result
+
+    def cached(self, name, ttl):
+        """
+        装饰器：把工具函数 function(arguments) 的结果放进缓存
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(arguments):
+                return self.call(name, arguments, function, ttl)
+            return wrapper
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_saved_rate": (self.hits + self.coalesced) / total if total else 0.0,
+        }
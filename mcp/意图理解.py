@@ -1,6 +1,9 @@
 import os
 import json
-from openai import OpenAI
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_client import get_client
 
 # 定义工具
 tools = [
@@ -30,10 +33,7 @@ tools_string = json.dumps(tools,ensure_ascii=False)
 system_prompt = f"""You are Qwen, created by Alibaba Cloud. You are a helpful assistant. You may call one or more tools to assist with the user query. The tools you can use are as follows:
 {tools_string}
 Response in INTENT_MODE."""
-client = OpenAI(
-    api_key=os.getenv("DASHSCOPE_API_KEY"),
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-)
+client = get_client()
 messages = [
     {'role': 'system', 'content': system_prompt},
     {'role': 'user', 'content': "杭州天气"}
@@ -1,33 +1,36 @@
 import os
-from openai import OpenAI
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_history import ConversationHistory, make_llm_summarizer
+from llm_client import get_client
 
 
 def get_response(messages):
-    client = OpenAI(
-        # 若没有配置环境变量，请用阿里云百炼API Key将下行替换为：api_key="sk-xxx",
-        api_key=os.getenv("DASHSCOPE_API_KEY"),
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-    )
+    # 共享客户端复用同一个连接池，每轮对话不再重新建立连接
+    client = get_client()
     # 模型列表：https://help.aliyun.com/zh/model-studio/getting-started/models
     completion = client.chat.completions.create(model="qwen-plus", messages=messages)
     return completion
 
-# 初始化一个 messages 数组
-messages = [
+# 初始化 system 消息
+messages_system_list = [
     {
         "role": "system",
         "content": """你是一名阿里云百炼手机商店的店员，你负责给用户推荐手机。手机有两个参数：屏幕尺寸（包括6.1英寸、6.5英寸、6.7英寸）、分辨率（包括2K、4K）。
         你一次只能向用户提问一个参数。如果用户提供的信息不全，你需要反问他，让他提供没有提供的参数。如果参数收集完成，你要说：我已了解您的购买意向，请稍等。""",
     }
 ]
+# 对话历史按 token 预算管理：超出预算时把较早的对话折叠成摘要，每轮发送的消息不会无限增长
+history = ConversationHistory(messages_system_list, summarizer=make_llm_summarizer(get_client()))
 assistant_output = "欢迎光临阿里云百炼手机商店，您需要购买什么尺寸的手机呢？"
 print(f"模型输出：{assistant_output}\n")
 while "我已了解您的购买意向" not in assistant_output:
     user_input = input("请输入：")
-    # 将用户问题信息添加到messages列表中
-    messages.append({"role": "user", "content": user_input})
-    assistant_output = get_response(messages).choices[0].message.content
-    # 将大模型的回复信息添加到messages列表中
-    messages.append({"role": "assistant", "content": assistant_output})
+    # 将用户问题信息添加到对话历史中
+    history.append({"role": "user", "content": user_input})
+    assistant_output = get_response(history.messages()).choices[0].message.content
+    # 将大模型的回复信息添加到对话历史中
+    history.append({"role": "assistant", "content": assistant_output})
     print(f"模型输出：{assistant_output}")
     print("\n")
\ No newline at end of file
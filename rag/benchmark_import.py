@@ -0,0 +1,54 @@
+# 导入耗时测试：在全新的子进程中分别测量
+#   1. import rag01 的耗时（现在不会加载嵌入模型，也不会导入 torch）
+#   2. 第一次调用 get_embedding_model() 的耗时（即以前每次 import rag01 都要付出的代价）
+# 用法: python benchmark_import.py [--repeat 5]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import rag01
+import_seconds = time.perf_counter() - start
+torch_loaded = "torch" in sys.modules
+model_seconds = None
+if "--with-model" in sys.argv:
+    start = time.perf_counter()
+    rag01.get_embedding_model()
+    model_seconds = time.perf_counter() - start
+print(json.dumps({"import": import_seconds, "torch_loaded": torch_loaded, "model": model_seconds}))
+"""
+
+
+def run_probe(with_model):
+    args = [sys.executable, "-c", PROBE] + (["--with-model"] if with_model else [])
+    output = subprocess.run(args, cwd=HERE, capture_output=True, text=True, check=True).stdout
+    # 最后一行是 JSON，前面可能有加载模型时打印的提示
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rag01 导入耗时测试")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-model", action="store_true", help="不测量嵌入模型的加载耗时")
+    args = parser.parse_args()
+
+    runs = [run_probe(with_model=False) for _ in range(args.repeat)]
+    import_ms = statistics.median(r["import"] for r in runs) * 1000
+    print(f"📦 import rag01 耗时(中位数): {import_ms:.1f} ms，导入后 torch 已加载: {runs[0]['torch_loaded']}")
+
+    if not args.skip_model:
+        run = run_probe(with_model=True)
+        model_ms = run["model"] * 1000
+        print(f"🔧 首次 get_embedding_model() 耗时: {model_ms:.1f} ms（以前每次 import rag01 都要付出）")
+        print(f"🚀 只做检索的工具导入提速约 {(import_ms + model_ms) / import_ms:.0f} 倍")
+
+
+if __name__ == "__main__":
+    main()
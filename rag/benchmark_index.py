@@ -0,0 +1,118 @@
+# 索引性能测试：对比不同索引类型/参数相对 flat 暴力检索的召回率(recall@k)和单条查询延迟(p50/p99)
+# 用法示例:
+#   python benchmark_index.py --num-docs 100000 --top-k 10
+#   python benchmark_index.py --embeddings my_embeddings.npy   # 使用真实的文档向量
+import argparse
+import time
+
+import numpy as np
+
+from index_factory import make_index_config, build_index, train_size
+
+
+def make_synthetic_embeddings(num_docs, num_queries, dimension, seed=0):
+    # 用高斯混合生成“成簇”的单位向量，分布上比纯随机向量更接近真实句向量
+    rng = np.random.default_rng(seed)
+    num_clusters = max(num_docs // 1000, 16)
+    centers = rng.standard_normal((num_clusters, dimension)).astype('float32')
+    total = num_docs + num_queries
+    vectors = centers[rng.integers(0, num_clusters, total)]
+    vectors += 0.5 * rng.standard_normal((total, dimension)).astype('float32')
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors[:num_docs], vectors[num_docs:]
+
+
+def run_queries(index, queries, top_k):
+    # 逐条查询以测量单条延迟（线上 search() 每次只查一个问题）
+    latencies = np.empty(len(queries))
+    result_ids = np.empty((len(queries), top_k), dtype='int64')
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], top_k)
+        latencies[i] = time.perf_counter() - start
+        result_ids[i] = ids[0]
+    return result_ids, latencies
+
+
+def recall_at_k(result_ids, ground_truth):
+    hits = sum(len(np.intersect1d(r, g)) for r, g in zip(result_ids, ground_truth))
+    return hits / ground_truth.size
+
+
+def benchmark(config, docs, queries, ground_truth, top_k):
+    index = build_index(docs.shape[1], config)
+    start = time.perf_counter()
+    if not index.is_trained:
+        sample = docs[:min(len(docs), train_size(config))]
+        index.train(sample)
+    index.add(docs)
+    build_seconds = time.perf_counter() - start
+
+    result_ids, latencies = run_queries(index, queries, top_k)
+    return {
+        "recall": recall_at_k(result_ids, ground_truth),
+        "p50_ms": np.percentile(latencies, 50) * 1000,
+        "p99_ms": np.percentile(latencies, 99) * 1000,
+        "build_s": build_seconds,
+    }
+
+
+def default_configs(num_docs):
+    # FAISS 文档建议 nlist 取 sqrt(N) ~ 16*sqrt(N)，这里取下限以保证每个聚类有足够的训练样本
+    nlist = max(int(np.sqrt(num_docs)), 16)
+    configs = [make_index_config(type="flat")]
+    for nprobe in (1, 8, 32):
+        configs.append(make_index_config(type="ivf", nlist=nlist, nprobe=nprobe))
+    for ef_search in (16, 64, 256):
+        configs.append(make_index_config(type="hnsw", ef_search=ef_search))
+    for nprobe in (8, 32):
+        configs.append(make_index_config(type="ivfpq", nlist=nlist, nprobe=nprobe))
+    return configs
+
+
+def describe(config):
+    index_type = config["type"]
+    if index_type == "ivf":
+        return f"ivf nlist={config['nlist']} nprobe={config['nprobe']}"
+    if index_type == "hnsw":
+        return f"hnsw M={config['hnsw_m']} efSearch={config['ef_search']}"
+    if index_type == "ivfpq":
+        return (f"ivfpq nlist={config['nlist']} m={config['pq_m']}x{config['pq_nbits']} "
+                f"nprobe={config['nprobe']}")
+    return "flat"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FAISS 索引召回率/延迟测试")
+    parser.add_argument("--num-docs", type=int, default=50000)
+    parser.add_argument("--num-queries", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--embeddings", help="真实文档向量的 .npy 文件（会从中抽取查询向量）")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype('float32')
+        rng = np.random.default_rng(0)
+        query_ids = rng.choice(len(vectors), size=min(args.num_queries, len(vectors)), replace=False)
+        queries = vectors[query_ids]
+        docs = np.delete(vectors, query_ids, axis=0)
+    else:
+        docs, queries = make_synthetic_embeddings(args.num_docs, args.num_queries, args.dimension)
+
+    print(f"📊 文档数: {len(docs)}, 查询数: {len(queries)}, 维度: {docs.shape[1]}, top_k: {args.top_k}")
+
+    # flat 暴力检索的结果作为召回率的标准答案
+    flat = build_index(docs.shape[1], make_index_config(type="flat"))
+    flat.add(docs)
+    _, ground_truth = flat.search(queries, args.top_k)
+
+    print(f"{'配置':<45}{'recall@k':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'构建(s)':>10}")
+    for config in default_configs(len(docs)):
+        stats = benchmark(config, docs, queries, ground_truth, args.top_k)
+        print(f"{describe(config):<45}{stats['recall']:>10.3f}{stats['p50_ms']:>10.3f}"
+              f"{stats['p99_ms']:>10.3f}{stats['build_s']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# BM25 倒排索引：作为向量检索的补充，擅长精确匹配编号、产品名等关键词
+# 倒排表采用 CSR 式的紧凑数组存储，而不是“每个文档一个 dict”：
+#   term_ptr  : int64[V+1]，第 t 个词的倒排表为 post_docs[term_ptr[t]:term_ptr[t+1]]
+#   post_docs : int32，出现该词的文档 id（递增）
+#   post_tfs  : uint16，该词在对应文档中的词频
+#   doc_lens  : int32[N]，每个文档的词数
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+try:
+    # 可选依赖：安装 jieba 后对中文按词切分，否则退化为单字 + 相邻二字切分
+    import jieba
+    jieba.setLogLevel(60)
+except ImportError:
+    jieba = None
+
+# 连续的中日韩文字，或者由字母、数字及 _ . - 组成的词（保留 "gpt-4o"、"v1.2" 这类标识符）
+_TOKEN_RE = re.compile(r"[一-鿿㐀-䶿]+|[a-z0-9][a-z0-9_.\-]*[a-z0-9]|[a-z0-9]")
+
+
+def tokenize(text):
+    tokens = []
+    for piece in _TOKEN_RE.findall(text.lower()):
+        if not ('㐀' <= piece[0] <= '鿿'):
+            tokens.append(piece)
+        elif jieba is not None:
+            tokens.extend(w for w in jieba.lcut_for_search(piece) if w.strip())
+        else:
+            tokens.extend(piece)
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.term_ptr = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tfs = np.zeros(0, dtype=np.uint16)
+        self.doc_lens = np.zeros(0, dtype=np.int32)
+        self._avgdl = None
+        # 新增但尚未合并进 CSR 数组的 (词 id, 文档 id, 词频)，每批一组数组
+        self._pending = []
+        # 多个检索线程可能同时触发合并和 avgdl 的计算，修改索引的操作都在锁内进行
+        self._lock = threading.Lock()
+
+    @property
+    def num_docs(self):
+        return len(self.doc_lens)
+
+    def add(self, texts):
+        """
+        追加文档，文档 id 依次接在已有文档之后（与向量索引中的顺序一致）
+        """
+        counted = [Counter(tokenize(text)) for text in texts]
+        with self._lock:
+            term_ids, doc_ids, tfs, lens = [], [], [], []
+            doc_id = self.num_docs
+            for counts in counted:
+                for term, tf in counts.items():
+                    term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                    doc_ids.append(doc_id)
+                    tfs.append(tf)
+                lens.append(sum(counts.values()))
+                doc_id += 1
+            self._pending.append((
+                np.array(term_ids, dtype=np.int64),
+                np.array(doc_ids, dtype=np.int32),
+                np.minimum(np.array(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16),
+            ))
+            self.doc_lens = np.concatenate([self.doc_lens, np.array(lens, dtype=np.int32)])
+            self._avgdl = None
+
+    def _merge_pending(self):
+        # 调用方需持有 self._lock
+        if not self._pending:
+            return
+        num_terms = len(self.vocab)
+        old_terms = np.repeat(np.arange(len(self.term_ptr) - 1), np.diff(self.term_ptr))
+        terms = np.concatenate([old_terms] + [p[0] for p in self._pending])
+        docs = np.concatenate([self.post_docs] + [p[1] for p in self._pending])
+        tfs = np.concatenate([self.post_tfs] + [p[2] for p in self._pending])
+        # 新文档 id 都比旧的大，按词 id 稳定排序后每个倒排表内的文档 id 仍然递增
+        order = np.argsort(terms, kind='stable')
+        self.post_docs = docs[order]
+        self.post_tfs = tfs[order]
+        self.term_ptr = np.zeros(num_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=num_terms), out=self.term_ptr[1:])
+        self._pending = []
+
+    def search(self, query, top_k=10):
+        """
+        :return: (文档 id 数组, BM25 分数数组)，按分数从高到低排列
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            self._merge_pending()
+            # 合并后的数组只会被整体替换、不会原地修改，取出引用后即可在锁外计算分数
+            term_ptr, post_docs, post_tfs, doc_lens = self.term_ptr, self.post_docs, self.post_tfs, self.doc_lens
+            term_ids = [self.vocab[t] for t in query_terms if t in self.vocab]
+            n = len(doc_lens)
+            if n and self._avgdl is None:
+                self._avgdl = max(float(doc_lens.mean()), 1.0)
+            avgdl = self._avgdl
+        if n == 0 or not term_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        scores = np.zeros(n, dtype=np.float32)
+        for t in term_ids:
+            start, end = term_ptr[t], term_ptr[t + 1]
+            docs = post_docs[start:end]
+            tf = post_tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lens[docs] / avgdl)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return candidates, scores[candidates]
+
+    def save(self, path):
+        with self._lock:
+            self._merge_pending()
+            terms = sorted(self.vocab, key=self.vocab.get)
+            arrays = {
+                "term_ptr": self.term_ptr,
+                "post_docs": self.post_docs,
+                "post_tfs": self.post_tfs,
+                "doc_lens": self.doc_lens,
+            }
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, terms=np.array(terms, dtype=str), params=np.array([self.k1, self.b]), **arrays)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            index.vocab = {term: i for i, term in enumerate(data["terms"].tolist())}
+            index.term_ptr = data["term_ptr"]
+            index.post_docs = data["post_docs"]
+            index.post_tfs = data["post_tfs"]
+            index.doc_lens = data["doc_lens"]
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    倒数排名融合(RRF)：每个文档的得分为它在各路结果中 1/(k + 名次) 之和，名次从 1 开始
+    :param rankings: 多路检索结果，每一路是按相关度从高到低排列的文档 id 序列
+    :return: (文档 id 数组, RRF 分数数组)，按分数从高到低排列
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(np.asarray(ranking).tolist(), start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    ids = sorted(fused, key=fused.get, reverse=True)
+    return np.array(ids, dtype=np.int64), np.array([fused[i] for i in ids], dtype=np.float32)
@@ -0,0 +1,47 @@
+# 文本切片与内容哈希：长文档切成有重叠的片段，每个片段用内容哈希标识，
+# 重建索引时据此判断哪些片段是新增/修改/删除的，未变化的片段不再重新嵌入
+import hashlib
+
+import numpy as np
+
+# 切片时优先在这些字符之后断开，尽量不把一句话切成两半
+SENTENCE_ENDINGS = "。！？；\n.!?;"
+# 内容哈希：blake2b 取 16 字节，存成定长字节数组，比十六进制字符串省一半空间。
+# 用 void 类型而不是 "S16"：后者取值时会去掉末尾的 \x00，导致哈希对不上
+DIGEST_SIZE = 16
+DIGEST_DTYPE = np.dtype(f"V{DIGEST_SIZE}")
+
+
+def chunk_digest(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=DIGEST_SIZE).digest()
+
+
+def chunk_text(text, chunk_size=500, overlap=50):
+    """
+    按字符数切片，相邻片段之间重叠 overlap 个字符
+    :param chunk_size: 每个片段的最大字符数
+    :param overlap: 相邻片段重叠的字符数，避免答案恰好被切断在两个片段之间
+    :return: 片段列表
+    """
+    if overlap >= chunk_size:
+        raise ValueError(f"overlap({overlap}) 必须小于 chunk_size({chunk_size})")
+    text = text.strip()
+    if len(text) <= chunk_size:
+        return [text] if text else []
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # 在窗口内找最后一个句子结束符；要求切点在 start + overlap 之后，保证下一片段能向前推进
+            cut = max(text.rfind(p, start + overlap + 1, end) for p in SENTENCE_ENDINGS)
+            if cut != -1:
+                end = cut + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = end - overlap
+    return chunks
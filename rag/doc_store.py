@@ -0,0 +1,115 @@
+# 基于 mmap 的只追加文档存储，替代 documents.pkl
+#   documents.{g}.bin : 所有文档的 UTF-8 字节依次拼接成的一整块数据
+#   offsets.{g}.bin   : int64 数组，共 N+1 个元素，第 i 条文档为 blob[offsets[i]:offsets[i+1]]
+# 加载时只做 mmap，不解码任何文本；检索时只读取命中的那几条文档。
+# 多个进程打开同一份文件时共享操作系统的页缓存，加载耗时与文档数量无关。
+import mmap
+import os
+
+import numpy as np
+
+OFFSET_DTYPE = np.dtype('<i8')
+
+
+class DocStore:
+    def __init__(self, directory, generation):
+        self.generation = generation
+        self.blob_path = os.path.join(directory, f"documents.{generation}.bin")
+        self.offsets_path = os.path.join(directory, f"offsets.{generation}.bin")
+        self.count = 0
+        self._blob = None
+        self._offsets = None
+
+    @classmethod
+    def create(cls, directory, generation):
+        """
+        新建一个空的文档存储
+        """
+        store = cls(directory, generation)
+        os.makedirs(directory, exist_ok=True)
+        with open(store.blob_path, 'wb'):
+            pass
+        with open(store.offsets_path, 'wb') as f:
+            f.write(np.zeros(1, dtype=OFFSET_DTYPE).tobytes())
+        store._map()
+        return store
+
+    @classmethod
+    def open(cls, directory, generation, count):
+        """
+        打开已有的文档存储，只映射已提交的前 count 条文档。
+        文件末尾可能残留上次崩溃时未提交的数据，它们会被忽略，并在下次追加时被截掉。
+        """
+        store = cls(directory, generation)
+        store.count = count
+        store._map()
+        return store
+
+    def _map(self):
+        self.close()
+        self._offsets = np.memmap(self.offsets_path, dtype=OFFSET_DTYPE, mode='r', shape=(self.count + 1,))
+        blob_size = int(self._offsets[self.count])
+        if blob_size == 0:
+            # 长度为 0 的文件不能 mmap
+            self._blob = b""
+            return
+        with open(self.blob_path, 'rb') as f:
+            self._blob = mmap.mmap(f.fileno(), blob_size, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._blob = None
+        self._offsets = None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < self.count:
+            raise IndexError(idx)
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return self._blob[start:end].decode('utf-8')
+
+    def get_many(self, ids):
+        """
+        批量读取文档：一次性取出所有起止偏移，只解码这些文档
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = self._offsets[ids]
+        ends = self._offsets[ids + 1]
+        blob = self._blob
+        return [blob[s:e].decode('utf-8') for s, e in zip(starts.tolist(), ends.tolist())]
+
+    def append(self, texts):
+        """
+        在已映射的数据之后追加文档。写入的数据在调用 sync() 并提交 manifest 之前都不算生效
+        """
+        encoded = [text.encode('utf-8') for text in texts]
+        if not encoded:
+            return
+        end = int(self._offsets[self.count])
+        lengths = np.fromiter((len(b) for b in encoded), dtype=OFFSET_DTYPE, count=len(encoded))
+        new_offsets = end + np.cumsum(lengths)
+        # Windows 上不能截断仍被映射的文件，写入前先释放自己的映射
+        self.close()
+
+        _write_at(self.blob_path, end, b"".join(encoded))
+        _write_at(self.offsets_path, (self.count + 1) * OFFSET_DTYPE.itemsize, new_offsets.tobytes())
+
+        self.count += len(encoded)
+        self._map()
+
+    def sync(self):
+        for path in (self.blob_path, self.offsets_path):
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+
+
+def _write_at(path, position, data):
+    # 从 position 处写入数据；若文件在此之后还有未提交的残留数据，先截掉
+    with open(path, 'r+b') as f:
+        if f.seek(0, os.SEEK_END) > position:
+            f.truncate(position)
+        f.seek(position)
+        f.write(data)
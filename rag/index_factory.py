@@ -0,0 +1,70 @@
+# FAISS 索引工厂：根据配置创建 flat / ivf / hnsw / ivfpq 四种索引
+import faiss
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# 默认配置：构建参数(nlist/hnsw_m/pq_m/...)决定索引结构，创建后不可更改；
+# 查询参数(nprobe/ef_search)可以在查询时随时调整，用于在召回率和延迟之间取舍
+DEFAULT_INDEX_CONFIG = {
+    "type": "flat",
+    "nlist": 1024,            # IVF 倒排列表(聚类中心)个数
+    "hnsw_m": 32,             # HNSW 每个节点的邻居数
+    "ef_construction": 200,   # HNSW 建图时的搜索宽度
+    "pq_m": 48,               # PQ 子向量个数，必须能整除向量维度
+    "pq_nbits": 8,            # 每个子向量的编码位数
+    "train_size": None,       # 训练样本数，None 表示按 nlist 自动计算
+    "nprobe": 16,             # IVF 查询时访问的倒排列表个数
+    "ef_search": 64,          # HNSW 查询时的搜索宽度
+}
+# 可以随时调整的查询参数，其余参数都属于索引结构
+SEARCH_PARAMS = ("nprobe", "ef_search")
+
+
+def make_index_config(**overrides):
+    unknown = set(overrides) - set(DEFAULT_INDEX_CONFIG)
+    if unknown:
+        raise ValueError(f"未知的索引参数: {sorted(unknown)}")
+    config = dict(DEFAULT_INDEX_CONFIG)
+    config.update(overrides)
+    if config["type"] not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型 {config['type']!r}，可选: {INDEX_TYPES}")
+    return config
+
+
+def factory_string(config):
+    index_type = config["type"]
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf":
+        return f"IVF{config['nlist']},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{config['hnsw_m']}"
+    return f"IVF{config['nlist']},PQ{config['pq_m']}x{config['pq_nbits']}"
+
+
+def build_index(dimension, config):
+    if config["type"] == "ivfpq" and dimension % config["pq_m"] != 0:
+        raise ValueError(f"pq_m={config['pq_m']} 不能整除向量维度 {dimension}")
+    index = faiss.index_factory(dimension, factory_string(config), faiss.METRIC_L2)
+    if config["type"] == "hnsw":
+        index.hnsw.efConstruction = config["ef_construction"]
+    apply_search_params(index, config)
+    return index
+
+
+def train_size(config):
+    """
+    训练所需的样本数：flat/hnsw 不需要训练；IVF 类索引按 FAISS 的建议
+    每个聚类中心至少 39 个样本
+    """
+    if config["type"] in ("flat", "hnsw"):
+        return 0
+    return config["train_size"] or config["nlist"] * 39
+
+
+def apply_search_params(index, config):
+    params = faiss.ParameterSpace()
+    if config["type"] in ("ivf", "ivfpq"):
+        params.set_index_parameter(index, "nprobe", config["nprobe"])
+    elif config["type"] == "hnsw":
+        params.set_index_parameter(index, "efSearch", config["ef_search"])
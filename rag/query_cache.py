@@ -0,0 +1,161 @@
+# 查询缓存：缓存问题的嵌入向量和 (问题, top_k) 的检索结果，避免重复调用嵌入模型
+# 所有操作都加锁，可以在多个检索线程之间共享
+import os
+import pickle
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    # 全角/半角统一、去掉首尾及多余空白、英文转小写，使“同一个问题”命中同一条缓存
+    query = unicodedata.normalize('NFKC', query)
+    return " ".join(query.split()).lower()
+
+
+class LRUCache:
+    """
+    带过期时间的 LRU 缓存：超过 maxsize 时淘汰最久未使用的条目，超过 ttl 秒的条目视为失效
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (value, 过期时间戳)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > time.time()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        # 按 LRU 次序（最久未使用的在前）返回 (key, (value, 过期时间戳)) 列表的快照
+        with self._lock:
+            return list(self._data.items())
+
+    def replace_items(self, items):
+        with self._lock:
+            self._data = OrderedDict(items[-self.maxsize:])
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class QueryCache:
+    """
+    两级缓存：
+      - 嵌入缓存：规范化后的问题 -> 问题向量，与索引内容无关，可长期保留
+      - 结果缓存：(规范化后的问题, top_k) -> 检索结果，绑定索引版本，索引一变化就整体失效；
+        其他检索方式（如混合检索）用 mode 区分，mode 中包含影响结果的参数
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, result_maxsize=1024, result_ttl=None, persist_path=None):
+        """
+        :param persist_path: 缓存持久化文件路径；设置后初始化时自动加载，调用 save() 写回，进程重启后缓存依然有效
+        """
+        self.embeddings = LRUCache(maxsize, ttl)
+        self.results = LRUCache(result_maxsize, result_ttl)
+        self.results_generation = None
+        # 保证“检查索引版本 -> 清空旧结果 -> 读写结果”是一个整体，不会和其他线程交错
+        self._results_lock = threading.Lock()
+        self.persist_path = persist_path
+        if persist_path and os.path.exists(persist_path):
+            self.load(persist_path)
+
+    def get_embedding(self, query):
+        return self.embeddings.get(normalize_query(query))
+
+    def put_embedding(self, query, embedding):
+        self.embeddings.put(normalize_query(query), embedding)
+
+    @staticmethod
+    def _result_key(query, top_k, mode):
+        key = (normalize_query(query), top_k)
+        return key if mode is None else key + (mode,)
+
+    def get_results(self, query, top_k, generation, mode=None):
+        """
+        :param mode: 检索方式及其参数，如 ("hybrid", candidates, rrf_k)；None 表示向量检索
+        """
+        with self._results_lock:
+            # 索引版本变化后，之前缓存的检索结果全部作废
+            self._check_generation(generation)
+            results = self.results.get(self._result_key(query, top_k, mode))
+        if results is None:
+            return None
+        return [dict(r) for r in results]
+
+    def put_results(self, query, top_k, generation, results, mode=None):
+        with self._results_lock:
+            self._check_generation(generation)
+            self.results.put(self._result_key(query, top_k, mode), [dict(r) for r in results])
+
+    def _check_generation(self, generation):
+        if generation != self.results_generation:
+            self.results.clear()
+            self.results_generation = generation
+
+    def invalidate_results(self):
+        with self._results_lock:
+            self.results.clear()
+            self.results_generation = None
+
+    def stats(self):
+        return {"embedding": self.embeddings.stats(), "result": self.results.stats()}
+
+    def save(self, path=None):
+        path = path or self.persist_path
+        if not path:
+            raise ValueError("未指定缓存持久化路径")
+        with self._results_lock:
+            state = {
+                "embeddings": self.embeddings.items(),
+                "results": self.results.items(),
+                "results_generation": self.results_generation,
+            }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        # 按原有顺序放回，保留 LRU 次序；已过期的条目在下次访问时自动淘汰
+        self.embeddings.replace_items(state["embeddings"])
+        with self._results_lock:
+            self.results.replace_items(state["results"])
+            self.results_generation = state["results_generation"]
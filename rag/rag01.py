@@ -1,145 +1,622 @@
 # 导入所需的库
 import numpy as np
 import faiss
-import pickle
+import json
+import glob
 import os
-# 需要安装 openai: pip install openai
-from openai import OpenAI
-from sentence_transformers import SentenceTransformer
+import sys
+from itertools import islice
+from index_factory import SEARCH_PARAMS, make_index_config, build_index, train_size, apply_search_params
+from doc_store import DocStore
+from query_cache import QueryCache
+from bm25 import BM25Index, reciprocal_rank_fusion
+from semantic_cache import SemanticCache, context_fingerprint
+from chunking import DIGEST_DTYPE, chunk_digest, chunk_text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import llm_client as shared_llm  # 导入时不会导入 openai
 
 # ----------------------------
 # 一、配置参数
 # ----------------------------
 
 VECTOR_DB_DIR = "vector_db"
-INDEX_PATH = os.path.join(VECTOR_DB_DIR, "faiss_index.bin")
-DOCS_PATH = os.path.join(VECTOR_DB_DIR, "documents.pkl")
+# manifest.json 记录当前生效的版本号(generation)，是每次写入的“提交点”
+MANIFEST_PATH = os.path.join(VECTOR_DB_DIR, "manifest.json")
+# 查询缓存的持久化文件，进程重启后缓存依然有效
+QUERY_CACHE_PATH = os.path.join(VECTOR_DB_DIR, "query_cache.pkl")
+# 每批嵌入的文档数：控制入库时内存中同时存在的向量数量
+INGEST_BATCH_SIZE = 256
+# sync_documents 切片参数：每个片段的最大字符数，以及相邻片段重叠的字符数
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 # 通义千问模型名称 (请根据你在百炼平台选择的模型更改)
 GENERATION_MODEL_NAME = 'qwen-plus' # 或者 'qwen-turbo', 'qwen-max', 'qwen-long'
 
-# 设置 OpenAI 风格的客户端以调用阿里云百炼平台
-# 请将 'YOUR_DASHSCOPE_API_KEY' 替换为你在阿里云百炼平台获取的实际 API Key
-# 或者设置环境变量 DASHSCOPE_API_KEY
-api_key = os.getenv('DASHSCOPE_API_KEY')
-if not api_key or api_key == 'YOUR_DASHSCOPE_API_KEY':
-    raise ValueError("请设置环境变量 DASHSCOPE_API_KEY 或在代码中配置有效的 API Key")
-
-# 配置 OpenAI 客户端使用阿里云百炼服务
-llm_client = OpenAI(
-    api_key=api_key,
-    base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-)
-
 # ----------------------------
-# 二、加载预训练模型 (仅嵌入模型)
+# 二、延迟创建嵌入模型和大模型客户端
 # ----------------------------
+# 导入本模块时不加载模型、不创建客户端：SentenceTransformer 会连带导入 torch，耗时数秒。
+# 它们在第一次真正用到时才创建，也可以直接传入已创建好的对象。
+# 只加载索引做检索、不生成回答的工具因此不必创建大模型客户端，也不必配置 API Key。
+
+_embedding_model = None
+_llm_client = None
+
 
-print("🔧 正在加载嵌入模型...")
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+def get_embedding_model():
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+
+        print("🔧 正在加载嵌入模型...")
+        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+
+def get_llm_client():
+    global _llm_client
+    if _llm_client is None:
+        # 需要安装 openai: pip install openai
+        # 使用共享客户端（连接池、keep-alive、超时和重试由 llm_client 统一配置），需设置环境变量 DASHSCOPE_API_KEY
+        _llm_client = shared_llm.get_client()
+    return _llm_client
 
 # ----------------------------
 # 三、定义本地向量数据库类
 # ----------------------------
 
-class SimpleVectorDB:
-    def __init__(self, dimension=384):
-        self.dimension = dimension
-        self.index = None
-        self.documents = []
-        self.is_loaded = False
+def _index_path(generation):
+    return os.path.join(VECTOR_DB_DIR, f"faiss_index.{generation}.bin")
 
-    def create_and_save(self, documents):
-        print("🧠 正在为文档生成向量表示（嵌入）...")
-        doc_embeddings = embedding_model.encode(documents)
-        doc_embeddings = np.array(doc_embeddings).astype('float32')
 
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.index.add(doc_embeddings)
+def _bm25_path(generation):
+    return os.path.join(VECTOR_DB_DIR, f"bm25.{generation}.npz")
+
+
+def _chunks_path(generation):
+    return os.path.join(VECTOR_DB_DIR, f"chunks.{generation}.npy")
+
+
+def _read_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-        os.makedirs(VECTOR_DB_DIR, exist_ok=True)
-        faiss.write_index(self.index, INDEX_PATH)
 
-        with open(DOCS_PATH, 'wb') as f:
-            pickle.dump(documents, f)
+def _fsync_file(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
 
-        self.documents = documents
+
+def _atomic_write_json(path, obj):
+    # 先写临时文件并落盘，再用 os.replace 原子地替换目标文件
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _batched(iterable, batch_size):
+    # 把任意可迭代对象切成固定大小的批次，避免一次性把全部文档读入内存
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class SimpleVectorDB:
+    def __init__(self, dimension=384, index_config=None, query_cache=None, embedding_model=None,
+                 enable_bm25=True):
+        """
+        :param dimension: 向量维度
+        :param index_config: 索引配置，如 {"type": "hnsw", "ef_search": 128}，
+                             可用参数见 index_factory.DEFAULT_INDEX_CONFIG，默认 flat。
+                             load() 时索引结构以磁盘上的为准，这里给出的查询参数(nprobe/ef_search)仍然生效
+        :param query_cache: 查询缓存 QueryCache，默认使用一个仅在内存中的缓存
+        :param embedding_model: 嵌入模型（需提供 encode 方法），默认第一次嵌入时才加载 EMBEDDING_MODEL_NAME
+        :param enable_bm25: 是否在向量索引旁同时维护 BM25 倒排索引，供 hybrid_search 使用
+        """
+        self.dimension = dimension
+        self.index_config = make_index_config(**(index_config or {}))
+        # 调用方指定的查询参数，加载磁盘上的配置后仍然覆盖在上面
+        self._search_overrides = {k: v for k, v in (index_config or {}).items() if k in SEARCH_PARAMS}
+        self.index = None
+        self.doc_store = None
+        self.enable_bm25 = enable_bm25
+        self.bm25 = None
+        # 每个向量 id 对应片段的内容哈希，供 sync_documents 判断哪些片段没有变化
+        self.chunk_hashes = np.zeros(0, dtype=DIGEST_DTYPE)
+        self._pending_hashes = []
+        self.query_cache = query_cache if query_cache is not None else QueryCache()
+        self._embedding_model = embedding_model
+        self.generation = 0
+        self.is_loaded = False
+
+    @property
+    def embedding_model(self):
+        if self._embedding_model is None:
+            self._embedding_model = get_embedding_model()
+        return self._embedding_model
+
+    def _reset(self):
+        # 新建空索引和空文档存储；文档文件以即将提交的版本号命名，不会覆盖当前生效的文件
+        self.index = build_index(self.dimension, self.index_config)
+        if self.doc_store is not None:
+            self.doc_store.close()
+        self.doc_store = DocStore.create(VECTOR_DB_DIR, self.generation + 1)
+        self.bm25 = BM25Index() if self.enable_bm25 else None
+        self.chunk_hashes = np.zeros(0, dtype=DIGEST_DTYPE)
+        self._pending_hashes = []
         self.is_loaded = True
 
+    def _ensure_loaded(self):
+        # 磁盘上已有数据库时在其基础上追加，否则新建一个空库
+        if not self.is_loaded:
+            if _read_manifest() is not None:
+                self.load()
+            else:
+                self._reset()
+
+    def _rollback(self):
+        # 写入中途失败：丢弃内存中未提交的部分，恢复到磁盘上最后一次提交的状态
+        if _read_manifest() is not None:
+            self.load()
+        else:
+            self._reset()
+
+    def create_and_save(self, documents, batch_size=INGEST_BATCH_SIZE):
+        """
+        从头创建数据库（会覆盖已有数据）。即使没有任何文档也会提交一个空库，内存和磁盘始终一致
+        :return: 写入的文档数
+        """
+        manifest = _read_manifest()
+        # 沿用磁盘上的版本号，保证新版本的文件名不会覆盖当前生效的文件
+        self.generation = manifest["generation"] if manifest else 0
+        self._reset()
+        try:
+            added = self._ingest(documents, batch_size)
+            self._commit()
+        except BaseException:
+            self._rollback()
+            raise
+        self._remove_stale_files()
+
         print(f"✅ 成功创建并向量数据库保存到:")
-        print(f"   - 索引文件: {INDEX_PATH}")
-        print(f"   - 文档文件: {DOCS_PATH}")
+        print(f"   - 索引文件: {_index_path(self.generation)}")
+        print(f"   - 文档文件: {self.doc_store.blob_path}")
+        print(f"📊 共 {added} 条文档")
+        return added
+
+    def add_documents(self, documents, batch_size=INGEST_BATCH_SIZE):
+        """
+        增量入库：按批次嵌入新文档并追加到已有索引，最后原子提交到磁盘
+        :param documents: 文档字符串的可迭代对象（可以是生成器，逐批读取）
+        :param batch_size: 每批嵌入的文档数
+        :return: 本次新增的文档数
+        """
+        self._ensure_loaded()
+        try:
+            added = self._ingest(documents, batch_size)
+            if added:
+                self._commit()
+        except BaseException:
+            self._rollback()
+            raise
+        if added:
+            self._remove_stale_files()
+
+        print(f"📥 本次新增 {added} 条文档，当前共 {self.index.ntotal} 条")
+        return added
+
+    def sync_documents(self, documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                       batch_size=INGEST_BATCH_SIZE):
+        """
+        按内容哈希增量重建：文档先切片，只嵌入新增或修改过的片段，删除已经不存在的片段，
+        未变化的片段直接沿用已有的向量。适合每次拿到全量文档后定期重建索引。
+        :param documents: 当前全量文档字符串的可迭代对象
+        :param chunk_size: 每个片段的最大字符数
+        :param chunk_overlap: 相邻片段重叠的字符数
+        :return: (新增片段数, 删除片段数)
+        """
+        self._ensure_loaded()
+        known = set(self._all_chunk_hashes().tolist())
+        seen = set()
+
+        def new_chunks():
+            for document in documents:
+                for chunk in chunk_text(document, chunk_size, chunk_overlap):
+                    digest = chunk_digest(chunk)
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    if digest not in known:
+                        yield chunk
+
+        try:
+            added = self._ingest(new_chunks(), batch_size)
+            # 流式读完全部文档后，没有再出现的片段就是被删除或修改前的旧片段
+            seen_hashes = np.array(sorted(seen), dtype=DIGEST_DTYPE)
+            keep = np.isin(self._all_chunk_hashes(), seen_hashes)
+            deleted = int(len(keep) - keep.sum())
+            if deleted:
+                self._compact(np.flatnonzero(keep), batch_size)
+            if added or deleted:
+                self._commit()
+        except BaseException:
+            self._rollback()
+            raise
+        if added or deleted:
+            self._remove_stale_files()
+
+        print(f"🔄 同步完成：新增 {added} 个片段，删除 {deleted} 个片段，"
+              f"{len(seen) - added} 个未变化的片段无需重新嵌入，当前共 {self.index.ntotal} 个")
+        return added, deleted
+
+    def _ingest(self, texts, batch_size):
+        added = 0
+        # IVF 类索引在训练之前不能添加向量，先把向量暂存起来，攒够训练样本再一起训练并添加
+        pending = []
+        pending_count = 0
+        for batch in _batched(texts, batch_size):
+            print(f"🧠 正在为第 {added + 1}~{added + len(batch)} 条新文档生成向量表示（嵌入）...")
+            batch_embeddings = self.embedding_model.encode(batch)
+            batch_embeddings = np.array(batch_embeddings).astype('float32')
+            # 文本直接追加写入文档存储，不在内存中保留
+            self.doc_store.append(batch)
+            if self.bm25 is not None:
+                self.bm25.add(batch)
+            self._pending_hashes.append(np.array([chunk_digest(t) for t in batch], dtype=DIGEST_DTYPE))
+            added += len(batch)
+            if self.index.is_trained:
+                self.index.add(batch_embeddings)
+                continue
+            pending.append(batch_embeddings)
+            pending_count += len(batch_embeddings)
+            if pending_count >= train_size(self.index_config):
+                self._train_and_add(np.vstack(pending))
+                pending, pending_count = [], 0
+        if pending:
+            self._train_and_add(np.vstack(pending))
+        return added
+
+    def _all_chunk_hashes(self):
+        if self._pending_hashes:
+            self.chunk_hashes = np.concatenate([self.chunk_hashes] + self._pending_hashes)
+            self._pending_hashes = []
+        return self.chunk_hashes
+
+    def _compact(self, keep_ids, batch_size):
+        """
+        只保留 keep_ids 对应的片段：向量从现有索引中还原后加入一个同参数的新索引（IVF 无需重新训练），
+        文本拷贝到新的文档存储中，全程不调用嵌入模型
+        """
+        print(f"🧹 正在压缩数据库，保留 {len(keep_ids)} 个片段...")
+        old_index, old_store = self.index, self.doc_store
+        if self.index_config["type"] in ("ivf", "ivfpq"):
+            # IVF 索引需要建立 id -> 倒排位置的映射后才能按 id 还原向量
+            faiss.extract_index_ivf(old_index).make_direct_map()
+        new_index = faiss.clone_index(old_index)
+        new_index.reset()
+        apply_search_params(new_index, self.index_config)
+        new_store = DocStore.create(VECTOR_DB_DIR, self.generation + 1)
+        new_bm25 = BM25Index() if self.bm25 is not None else None
+
+        for start in range(0, len(keep_ids), batch_size):
+            ids = keep_ids[start:start + batch_size]
+            new_index.add(old_index.reconstruct_batch(ids))
+            texts = old_store.get_many(ids)
+            new_store.append(texts)
+            if new_bm25 is not None:
+                new_bm25.add(texts)
+
+        self.chunk_hashes = self._all_chunk_hashes()[keep_ids]
+        old_store.close()
+        self.index, self.doc_store, self.bm25 = new_index, new_store, new_bm25
+
+    def _train_and_add(self, embeddings):
+        nlist = self.index_config["nlist"]
+        if len(embeddings) < nlist:
+            raise ValueError(
+                f"❌ 训练样本不足：{self.index_config['type']} 索引需要至少 nlist={nlist} 条向量，"
+                f"当前只有 {len(embeddings)} 条，请减小 nlist 或改用 flat/hnsw 索引"
+            )
+        print(f"🏋️ 正在用 {len(embeddings)} 条向量训练 {self.index_config['type']} 索引...")
+        self.index.train(embeddings)
+        self.index.add(embeddings)
+
+    def set_search_params(self, nprobe=None, ef_search=None):
+        """
+        调整查询参数：nprobe 越大 IVF 召回越高，ef_search 越大 HNSW 召回越高，延迟也随之增加。
+        已提交的数据库会立即把新参数写入 manifest.json（版本号不变，索引文件不需要重写），重启后依然生效
+        """
+        if nprobe is not None:
+            self.index_config["nprobe"] = nprobe
+            self._search_overrides["nprobe"] = nprobe
+        if ef_search is not None:
+            self.index_config["ef_search"] = ef_search
+            self._search_overrides["ef_search"] = ef_search
+        if self.index is not None:
+            apply_search_params(self.index, self.index_config)
+        manifest = _read_manifest()
+        if manifest is not None and self.is_loaded and manifest["generation"] == self.generation:
+            manifest["index_config"] = self.index_config
+            _atomic_write_json(MANIFEST_PATH, manifest)
+        # 查询参数会影响检索结果
+        self.query_cache.invalidate_results()
+
+    def _commit(self):
+        """
+        原子提交：新版本的索引写入带版本号的新文件，文档只追加在已提交数据之后，
+        最后替换 manifest.json 切换版本并记录文档条数。任何一步崩溃，manifest 都仍指向
+        上一个完整一致的版本，索引文件和文档文件不会错配。
+        """
+        os.makedirs(VECTOR_DB_DIR, exist_ok=True)
+        generation = self.generation + 1
+        index_path = _index_path(generation)
+
+        faiss.write_index(self.index, index_path + ".tmp")
+        _fsync_file(index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+
+        self.doc_store.sync()
+
+        chunks_path = _chunks_path(generation)
+        np.save(chunks_path + ".tmp.npy", self._all_chunk_hashes())
+        _fsync_file(chunks_path + ".tmp.npy")
+        os.replace(chunks_path + ".tmp.npy", chunks_path)
+
+        if self.bm25 is not None:
+            self.bm25.save(_bm25_path(generation))
+
+        _atomic_write_json(MANIFEST_PATH, {
+            "generation": generation,
+            "ntotal": self.index.ntotal,
+            "docs_generation": self.doc_store.generation,
+            "bm25": self.bm25 is not None,
+            "dimension": self.dimension,
+            "index_config": self.index_config,
+        })
+        self.generation = generation
+
+    def _remove_stale_files(self):
+        """
+        提交成功后清理旧版本以及崩溃遗留的临时文件。此时数据已经提交，清理只是尽力而为：
+        删除失败（例如 Windows 上其他进程仍映射着旧的文档文件）时跳过，留给下一次提交再清理，不影响本次写入
+        """
+        keep = [_index_path(self.generation), _chunks_path(self.generation),
+                self.doc_store.blob_path, self.doc_store.offsets_path]
+        if self.bm25 is not None:
+            keep.append(_bm25_path(self.generation))
+        keep = {os.path.abspath(p) for p in keep}
+        patterns = ["faiss_index.*.bin*", "documents.*.bin", "offsets.*.bin", "bm25.*.npz", "chunks.*.npy"]
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(VECTOR_DB_DIR, pattern)):
+                if os.path.abspath(path) not in keep:
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"⚠️ 旧文件 {path} 暂时无法删除，将在下次提交时重试: {e}")
 
     def load(self):
-        if not os.path.exists(INDEX_PATH) or not os.path.exists(DOCS_PATH):
+        manifest = _read_manifest()
+        if manifest is None:
             raise FileNotFoundError(
                 f"❌ 找不到数据库文件！\n"
                 f"请先运行 create_and_save() 创建数据库。\n"
                 f"需要的文件:\n"
-                f"  {INDEX_PATH}\n"
-                f"  {DOCS_PATH}"
+                f"  {MANIFEST_PATH}"
             )
 
         print("📂 正在从磁盘加载向量数据库...")
-        self.index = faiss.read_index(INDEX_PATH)
+        generation = manifest["generation"]
+        # 索引结构以磁盘上保存的参数为准，调用方指定过的查询参数覆盖磁盘上的值
+        self.dimension = manifest["dimension"]
+        self.index_config = make_index_config(**{**manifest.get("index_config", {}), **self._search_overrides})
+        self.index = faiss.read_index(_index_path(generation))
+        apply_search_params(self.index, self.index_config)
+
+        # 文档存储只做 mmap，不读取任何文本
+        if self.doc_store is not None:
+            self.doc_store.close()
+        self.doc_store = DocStore.open(VECTOR_DB_DIR, manifest["docs_generation"], manifest["ntotal"])
+
+        if self.index.ntotal != len(self.doc_store):
+            raise RuntimeError(
+                f"❌ 数据库文件不一致：索引 {self.index.ntotal} 条，文档 {len(self.doc_store)} 条"
+            )
+
+        self.bm25 = BM25Index.load(_bm25_path(generation)) if manifest.get("bm25") else None
+        self.enable_bm25 = self.bm25 is not None
 
-        with open(DOCS_PATH, 'rb') as f:
-            self.documents = pickle.load(f)
+        if os.path.exists(_chunks_path(generation)):
+            self.chunk_hashes = np.load(_chunks_path(generation))
+        else:
+            # 旧版本的数据库没有保存片段哈希，从文档存储中补算一遍
+            self.chunk_hashes = np.array([chunk_digest(self.doc_store[i]) for i in range(len(self.doc_store))],
+                                         dtype=DIGEST_DTYPE)
+        self._pending_hashes = []
 
+        self.generation = generation
         self.is_loaded = True
         print("✅ 向量数据库加载成功！")
         print(f"📊 共加载 {self.index.ntotal} 个文档向量")
-        print(f"📘 共 {len(self.documents)} 条原始文本")
+        print(f"📘 共 {len(self.doc_store)} 条原始文本")
 
     def search(self, query, top_k=1):
         if not self.is_loaded:
             raise RuntimeError("❌ 数据库还未加载，请先调用 load() 或 create_and_save()")
 
-        print(f"🔍 正在检索与 '{query}' 最相关的文档...")
-        query_embedding = embedding_model.encode([query])
-        query_embedding = np.array(query_embedding).astype('float32')
-
-        distances, indices = self.index.search(query_embedding, top_k)
+        # 结果缓存与索引版本(generation)绑定，索引一旦变化就不会命中旧结果
+        cached = self.query_cache.get_results(query, top_k, self.generation)
+        if cached is not None:
+            print(f"⚡ 命中缓存：'{query}'")
+            return cached
 
-        results = []
-        for i in range(top_k):
-            doc_idx = indices[0][i]
-            if doc_idx == -1:
-                continue
-            text = self.documents[doc_idx]
-            score = float(distances[0][i])
-            results.append({'text': text, 'score': score})
+        print(f"🔍 正在检索与 '{query}' 最相关的文档...")
+        return self._search_batch([query], top_k)[0]
+
+    def search_many(self, queries, top_k=1):
+        """
+        批量检索：所有问题一次性嵌入，并对整个问题矩阵只做一次 FAISS 检索
+        :param queries: 问题列表
+        :param top_k: 每个问题返回的文档数
+        :return: 与 queries 一一对应的检索结果列表
+        """
+        if not self.is_loaded:
+            raise RuntimeError("❌ 数据库还未加载，请先调用 load() 或 create_and_save()")
 
+        all_results = [self.query_cache.get_results(q, top_k, self.generation) for q in queries]
+        missing = [i for i, r in enumerate(all_results) if r is None]
+        print(f"🔍 正在批量检索 {len(queries)} 个问题（缓存命中 {len(queries) - len(missing)} 个）...")
+        if missing:
+            searched = self._search_batch([queries[i] for i in missing], top_k)
+            for i, results in zip(missing, searched):
+                all_results[i] = results
+        return all_results
+
+    def hybrid_search(self, query, top_k=1, candidates=20, rrf_k=60):
+        """
+        混合检索：向量检索和 BM25 关键词检索各取前 candidates 个结果，再用倒数排名融合(RRF)合并
+        :param query: 问题
+        :param top_k: 返回的文档数
+        :param candidates: 每一路检索取回的候选数
+        :param rrf_k: RRF 平滑常数，越大则排名靠后的结果权重下降得越慢
+        :return: 检索结果列表，其中 score 为 RRF 分数（越大越相关，与 search() 的 L2 距离含义相反）
+        """
+        if not self.is_loaded:
+            raise RuntimeError("❌ 数据库还未加载，请先调用 load() 或 create_and_save()")
+        if self.bm25 is None:
+            raise RuntimeError("❌ 当前数据库没有 BM25 索引，请用 enable_bm25=True 重新创建")
+
+        candidates = max(candidates, top_k)
+        # 融合后的结果同样按索引版本缓存，缓存键中包含影响融合结果的参数
+        mode = ("hybrid", candidates, rrf_k)
+        cached = self.query_cache.get_results(query, top_k, self.generation, mode)
+        if cached is not None:
+            print(f"⚡ 命中缓存：'{query}'")
+            return cached
+
+        print(f"🔍 正在混合检索与 '{query}' 最相关的文档...")
+        _, dense_ids = self.index.search(self._encode_queries([query]), candidates)
+        dense_ids = dense_ids[0][dense_ids[0] != -1]
+        lexical_ids, _ = self.bm25.search(query, candidates)
+
+        fused_ids, fused_scores = reciprocal_rank_fusion([dense_ids, lexical_ids], k=rrf_k)
+        fused_ids, fused_scores = fused_ids[:top_k], fused_scores[:top_k]
+        texts = self.doc_store.get_many(fused_ids)
+        results = [{'text': text, 'score': float(score)} for text, score in zip(texts, fused_scores)]
+        self.query_cache.put_results(query, top_k, self.generation, results, mode)
         return results
 
+    def _search_batch(self, queries, top_k):
+        query_embeddings = self._encode_queries(queries)
+        distances, indices = self.index.search(query_embeddings, top_k)
+
+        # 向量化组装结果：命中的文档去重后一次性从文档存储中取出
+        valid = indices != -1
+        unique_ids, inverse = np.unique(indices[valid], return_inverse=True)
+        unique_texts = self.doc_store.get_many(unique_ids)
+        texts = iter([unique_texts[j] for j in inverse.tolist()])
+        scores = iter(distances[valid].tolist())
+        counts = valid.sum(axis=1).tolist()
+
+        all_results = []
+        for query, count in zip(queries, counts):
+            results = [{'text': next(texts), 'score': next(scores)} for _ in range(count)]
+            self.query_cache.put_results(query, top_k, self.generation, results)
+            all_results.append(results)
+        return all_results
+
+    def encode_query(self, query):
+        """
+        返回问题的向量（优先取自查询缓存）
+        """
+        return self._encode_queries([query])[0]
+
+    def _encode_queries(self, queries):
+        # 先查嵌入缓存，未命中的问题合并成一批只调用一次嵌入模型
+        embeddings = [self.query_cache.get_embedding(q) for q in queries]
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        if missing:
+            # 同一批里重复的问题只嵌入一次
+            unique_queries = list(dict.fromkeys(queries[i] for i in missing))
+            new_embeddings = self.embedding_model.encode(unique_queries)
+            new_embeddings = np.array(new_embeddings).astype('float32')
+            encoded = dict(zip(unique_queries, new_embeddings))
+            for query, embedding in encoded.items():
+                self.query_cache.put_embedding(query, embedding)
+            for i in missing:
+                embeddings[i] = encoded[queries[i]]
+        return np.vstack(embeddings)
+
 # ----------------------------
 # 四、RAG 主函数 (使用通义千问 - OpenAI API 风格)
 # ----------------------------
 
-def rag_query(db, question, top_k=1, model_name=GENERATION_MODEL_NAME):
+def retrieve_context(db, question, top_k=1, hybrid=True):
+    """
+    检索与问题最相关的文档，并用换行符拼成“上下文”
+    """
+    if hybrid and db.bm25 is not None:
+        search_results = db.hybrid_search(question, top_k=top_k)
+    else:
+        search_results = db.search(question, top_k=top_k)
+    retrieved_docs = [res['text'] for res in search_results]
+    return "\n".join(retrieved_docs)
+
+
+def build_messages(question, context):
+    # 构造提示词（Prompt）：告诉模型根据上下文回答问题
+    return [
+        {"role": "system", "content": "你是一个 helpful 的 AI 助手。请根据提供的信息回答问题。如果信息不足以回答，请说明原因，不要编造答案。"},
+        {"role": "user", "content": f"信息：\n{context}\n\n问题：{question}\n\n回答："}
+    ]
+
+
+def rag_query(db, question, top_k=1, model_name=GENERATION_MODEL_NAME, llm_client=None, hybrid=True,
+              answer_cache=None):
     """
     RAG 核心流程：检索相关文档 + 调用通义千问生成回答 (OpenAI API 风格)
     :param db: 向量数据库对象
     :param question: 用户的问题
     :param top_k: 检索前 k 个相关文档
     :param model_name: 通义千问模型名称
+    :param llm_client: OpenAI 风格的客户端，默认使用 get_llm_client()
+    :param hybrid: 数据库带有 BM25 索引时使用混合检索，否则只做向量检索
+    :param answer_cache: 语义答案缓存 SemanticCache，相似问题且上下文不变时直接返回缓存的答案
     :return: 包含问题、上下文、回答的字典
     """
-    # 1. 从数据库中检索与问题最相关的文档
-    search_results = db.search(question, top_k=top_k)
-
-    # 2. 提取检索到的文档内容，拼成“上下文”
-    retrieved_docs = [res['text'] for res in search_results]
-    context = "\n".join(retrieved_docs) # 用换行符连接
+    # 1~2. 从数据库中检索与问题最相关的文档，拼成“上下文”
+    context = retrieve_context(db, question, top_k=top_k, hybrid=hybrid)
 
     # 3. 构造提示词（Prompt）：告诉模型根据上下文回答问题
-    messages = [
-        {"role": "system", "content": "你是一个 helpful 的 AI 助手。请根据提供的信息回答问题。如果信息不足以回答，请说明原因，不要编造答案。"},
-        {"role": "user", "content": f"信息：\n{context}\n\n问题：{question}\n\n回答："}
-    ]
+    messages = build_messages(question, context)
+
+    # 语义缓存：相似问题 + 相同上下文，直接复用之前的答案
+    if answer_cache is not None:
+        question_embedding = db.encode_query(question)
+        fingerprint = context_fingerprint(context)
+        cached_answer = answer_cache.lookup(question_embedding, fingerprint)
+        if cached_answer is not None:
+            print("⚡ 命中语义答案缓存，跳过生成")
+            return {
+                "question": question,
+                "retrieved_context": context,
+                "messages": messages,
+                "answer": cached_answer,
+                "cached": True
+            }
 
     # 4. 调用通义千问API生成回答 (OpenAI API 风格)
     print("🤖 正在调用通义千问生成回答...")
+    llm_client = llm_client or get_llm_client()
     try:
         completion = llm_client.chat.completions.create(
             model=model_name,
@@ -151,6 +628,8 @@ def rag_query(db, question, top_k=1, model_name=GENERATION_MODEL_NAME):
         )
         # 提取生成的文本
         answer = completion.choices[0].message.content.strip()
+        if answer_cache is not None:
+            answer_cache.put(question_embedding, fingerprint, question, answer)
 
     except Exception as e:
         print(f"❌ 调用通义千问时出现异常: {e}")
@@ -161,7 +640,8 @@ def rag_query(db, question, top_k=1, model_name=GENERATION_MODEL_NAME):
         "question": question,
         "retrieved_context": context,
         "messages": messages, # 返回用于调试的 messages
-        "answer": answer
+        "answer": answer,
+        "cached": False
     }
 
 
@@ -178,10 +658,12 @@ if __name__ == "__main__":
         "通义千问是由阿里云开发的超大规模语言模型，能够回答问题、创作文字。"
     ]
 
-    db = SimpleVectorDB(dimension=384)
+    db = SimpleVectorDB(dimension=384, query_cache=QueryCache(persist_path=QUERY_CACHE_PATH))
+    answer_cache = SemanticCache(dimension=384)
 
-    # 检查数据库是否已存在，如果不存在则创建
-    if not os.path.exists(INDEX_PATH) or not os.path.exists(DOCS_PATH):
+    # 检查数据库是否已存在，如果不存在则创建。
+    # 不对已有数据库调用 sync_documents：它把传入的文档当作全量语料，会删除通过其他方式加入的文档
+    if not os.path.exists(MANIFEST_PATH):
         print("未找到现有数据库，正在创建...")
         db.create_and_save(documents)
     else:
@@ -194,11 +676,14 @@ if __name__ == "__main__":
     while True:
         user_input = input("\n请输入您的问题: ").strip()
         if user_input.lower() in ['退出', 'quit']:
+            db.query_cache.save()
+            print(f"📈 缓存统计: {db.query_cache.stats()}")
+            print(f"📈 语义答案缓存统计: {answer_cache.stats()}")
             print("再见！")
             break
         if user_input:
             try:
-                result = rag_query(db, user_input, top_k=3)
+                result = rag_query(db, user_input, top_k=3, answer_cache=answer_cache)
                 print(f"\n❓ 问题: {result['question']}")
                 print(f"📄 检索到的信息: {result['retrieved_context']}")
                 print(f"💡 通义千问回答: {result['answer']}")
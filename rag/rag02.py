@@ -0,0 +1,198 @@
+# 异步 + 流式的 RAG 问答：在 rag01 的基础上
+#   1. 检索放到线程池中执行，不阻塞事件循环
+#   2. 通义千问以流式(stream=True)返回，生成一个字就输出一个字，首字延迟大大降低
+#   3. 一个进程内用 asyncio 同时处理多个问题，并用信号量限制最大并发数
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from rag01 import (
+    GENERATION_MODEL_NAME,
+    MANIFEST_PATH,
+    SimpleVectorDB,
+    build_messages,
+    retrieve_context,
+)
+from semantic_cache import SemanticCache, context_fingerprint
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import llm_client as shared_llm
+
+# ----------------------------
+# 一、配置参数
+# ----------------------------
+
+# 同时处理的问题数上限（同时也是同时打开的流式请求数上限）
+MAX_CONCURRENCY = 16
+# 检索线程数：查询缓存和 BM25 索引都已加锁，FAISS 检索和嵌入模型推理会释放 GIL，多个问题的检索可以并行
+RETRIEVAL_WORKERS = 4
+
+
+def get_async_llm_client():
+    # 连接池、超时和重试由 llm_client 统一配置
+    return shared_llm.get_async_client()
+
+
+# ----------------------------
+# 二、异步 RAG 服务
+# ----------------------------
+
+class AsyncRAGService:
+    def __init__(self, db, top_k=3, model_name=GENERATION_MODEL_NAME, llm_client=None,
+                 max_concurrency=MAX_CONCURRENCY, retrieval_workers=RETRIEVAL_WORKERS,
+                 max_tokens=200, hybrid=True, answer_cache=None):
+        """
+        :param db: 已加载的 SimpleVectorDB
+        :param llm_client: AsyncOpenAI 风格的客户端，默认使用 get_async_llm_client()
+        :param max_concurrency: 同时处理的问题数上限，超出的问题排队等待
+        :param retrieval_workers: 执行检索的线程数
+        :param answer_cache: 语义答案缓存 SemanticCache，命中时不再调用大模型
+        """
+        self.db = db
+        self.top_k = top_k
+        self.model_name = model_name
+        self.llm_client = llm_client
+        self.max_tokens = max_tokens
+        self.hybrid = hybrid
+        self.answer_cache = answer_cache
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="rag-retrieval")
+
+    async def stream(self, question):
+        """
+        流式回答一个问题：逐段产出模型生成的文本
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            context = await loop.run_in_executor(
+                self._executor,
+                partial(retrieve_context, self.db, question, top_k=self.top_k, hybrid=self.hybrid),
+            )
+            messages = build_messages(question, context)
+
+            if self.answer_cache is not None:
+                # 检索时已经把问题向量放进了查询缓存，这里取向量不会再调用嵌入模型
+                question_embedding = await loop.run_in_executor(self._executor, self.db.encode_query, question)
+                fingerprint = context_fingerprint(context)
+                cached_answer = self.answer_cache.lookup(question_embedding, fingerprint)
+                if cached_answer is not None:
+                    yield cached_answer
+                    return
+
+            llm_client = self.llm_client or get_async_llm_client()
+            stream = await llm_client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=0.7,
+                top_p=0.8,
+                stream=True,
+            )
+            parts = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            if self.answer_cache is not None:
+                self.answer_cache.put(question_embedding, fingerprint, question, "".join(parts).strip())
+
+    async def answer(self, question, on_token=None):
+        """
+        回答一个问题并返回完整结果，同时记录首字延迟
+        :param on_token: 每收到一段文本就调用一次的回调，可用来实时打印
+        """
+        start = time.perf_counter()
+        first_token_seconds = None
+        parts = []
+        try:
+            async for token in self.stream(question):
+                if first_token_seconds is None:
+                    first_token_seconds = time.perf_counter() - start
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+            answer = "".join(parts).strip()
+        except Exception as e:
+            print(f"❌ 调用通义千问时出现异常: {e}")
+            answer = f"抱歉，调用模型时出现异常: {e}"
+        return {
+            "question": question,
+            "answer": answer,
+            "first_token_seconds": first_token_seconds,
+            "total_seconds": time.perf_counter() - start,
+        }
+
+    async def answer_many(self, questions):
+        # 所有问题同时提交，由信号量控制实际并发数；返回顺序与 questions 一致
+        return await asyncio.gather(*(self.answer(q) for q in questions))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# ----------------------------
+# 三、主程序入口
+# ----------------------------
+
+async def interactive(service):
+    print("\n--- 欢迎使用流式 RAG 问答系统 ---")
+    print("输入 '退出' 或 'quit' 结束程序。")
+    loop = asyncio.get_running_loop()
+    while True:
+        user_input = (await loop.run_in_executor(None, input, "\n请输入您的问题: ")).strip()
+        if user_input.lower() in ['退出', 'quit']:
+            print("再见！")
+            break
+        if not user_input:
+            print("请输入一个有效问题。")
+            continue
+        print("💡 通义千问回答: ", end="", flush=True)
+        result = await service.answer(user_input, on_token=lambda t: print(t, end="", flush=True))
+        if result["first_token_seconds"] is not None:
+            print(f"\n⏱️ 首字延迟 {result['first_token_seconds']:.2f}s，总耗时 {result['total_seconds']:.2f}s")
+
+
+async def batch(service, questions_file):
+    with open(questions_file, 'r', encoding='utf-8') as f:
+        questions = [line.strip() for line in f if line.strip()]
+    start = time.perf_counter()
+    results = await service.answer_many(questions)
+    elapsed = time.perf_counter() - start
+    for result in results:
+        print(f"\n❓ 问题: {result['question']}\n💡 回答: {result['answer']}")
+    ttfts = sorted(r["first_token_seconds"] for r in results if r["first_token_seconds"] is not None)
+    print(f"\n📈 共 {len(results)} 个问题，耗时 {elapsed:.2f}s，吞吐 {len(results) / elapsed:.2f} 个/秒")
+    if ttfts:
+        print(f"⏱️ 首字延迟中位数 {ttfts[len(ttfts) // 2]:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="异步流式 RAG 问答")
+    parser.add_argument("--questions", help="问题文件（每行一个问题），指定后并发回答全部问题")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.path.exists(MANIFEST_PATH):
+        raise FileNotFoundError("❌ 找不到向量数据库，请先运行 rag01.py 创建")
+    db = SimpleVectorDB()
+    db.load()
+
+    answer_cache = SemanticCache(dimension=db.dimension)
+    service = AsyncRAGService(db, top_k=args.top_k, max_concurrency=args.concurrency, answer_cache=answer_cache)
+    try:
+        if args.questions:
+            asyncio.run(batch(service, args.questions))
+        else:
+            asyncio.run(interactive(service))
+    finally:
+        service.close()
+        print(f"📈 语义答案缓存统计: {answer_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
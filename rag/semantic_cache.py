@@ -0,0 +1,77 @@
+# 语义答案缓存：问题换个说法也能命中之前生成过的答案，省掉一次大模型调用
+# 问题向量单独存放在一个小的 FAISS 内积索引中（向量先归一化，内积即余弦相似度），
+# 每条缓存同时记录当时检索到的上下文指纹，只有“问题足够相似且上下文未变”才返回缓存的答案。
+import hashlib
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+def context_fingerprint(context):
+    return hashlib.sha256(context.encode('utf-8')).hexdigest()
+
+
+class SemanticCache:
+    def __init__(self, dimension=384, threshold=0.92, max_entries=1000, candidates=5):
+        """
+        :param threshold: 余弦相似度阈值，不低于该值的两个问题视为同一个问题
+        :param max_entries: 最多缓存的答案数，超出后淘汰最久未命中的条目
+        :param candidates: 每次查找取回的最相似问题数（相似问题可能对应不同的上下文）
+        """
+        self.dimension = dimension
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.candidates = candidates
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.entries = OrderedDict()  # 向量 id -> {"question", "fingerprint", "answer"}，按最近使用排序
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.context_changed = 0  # 找到了相似问题，但检索到的上下文已经变化
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.array(embedding, dtype='float32').reshape(1, -1)
+        faiss.normalize_L2(embedding)
+        return embedding
+
+    def lookup(self, embedding, fingerprint):
+        """
+        :return: 命中时返回缓存的答案，否则返回 None
+        """
+        if self.index.ntotal:
+            similarities, ids = self.index.search(self._normalize(embedding), self.candidates)
+            found_similar = False
+            for similarity, entry_id in zip(similarities[0].tolist(), ids[0].tolist()):
+                if entry_id == -1 or similarity < self.threshold:
+                    break
+                found_similar = True
+                entry = self.entries[entry_id]
+                if entry["fingerprint"] == fingerprint:
+                    self.entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry["answer"]
+            if found_similar:
+                self.context_changed += 1
+        self.misses += 1
+        return None
+
+    def put(self, embedding, fingerprint, question, answer):
+        entry_id = self._next_id
+        self._next_id += 1
+        self.index.add_with_ids(self._normalize(embedding), np.array([entry_id], dtype='int64'))
+        self.entries[entry_id] = {"question": question, "fingerprint": fingerprint, "answer": answer}
+        if len(self.entries) > self.max_entries:
+            evicted_id, _ = self.entries.popitem(last=False)
+            self.index.remove_ids(np.array([evicted_id], dtype='int64'))
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "context_changed": self.context_changed,
+            "hit_rate": self.hits / total if total else 0.0,
+        }